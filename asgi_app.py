@@ -0,0 +1,269 @@
+"""
+Modo assíncrono: python-socketio AsyncServer + SQLAlchemy async (asyncpg)
+
+Alternativa ao app.py (eventlet). Os handlers são os mesmos de game_events.py,
+então os eventos e os formatos das mensagens não mudam e os templates servem
+para os dois modos. Diferenças:
+
+- O handler continua síncrono e só mexe na memória: antes de chamá-lo, a sala
+  do evento é carregada do banco com await (room_store.autoload desligado) e,
+  depois, as mensagens que ele emitiu são enviadas com await, na mesma ordem.
+- A gravação em lote roda numa task asyncio, pelo engine asyncpg.
+
+Uso:
+    python asgi_app.py
+    uvicorn asgi_app:app --port 5000
+"""
+import asyncio
+import json
+import os
+
+import socketio
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlalchemy.orm import Session
+
+from database import init_db, create_async_db_engine, pool_stats, query_totals
+from game_events import EVENT_HANDLERS, event_query_stats, room_store, auto_stop_rounds
+from room_state import write_stats
+from round_timer import scheduler as round_scheduler, round_timer_stats
+from transport import OutboxTransport, use_transport
+import reaper
+import sharding
+from broadcast import coalescer, broadcast_stats
+from dictionary import dictionary_stats
+import metrics
+from log import get_logger, enable_room_debug, disable_room_debug, debug_rooms
+
+log = get_logger('server')
+
+FLUSH_INTERVAL = float(os.environ.get('FLUSH_INTERVAL', '0.5'))
+
+message_queue = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+sio = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins='*',
+    client_manager=socketio.AsyncRedisManager(message_queue) if message_queue else None,
+    ping_interval=int(os.environ.get('PING_INTERVAL', '25')),
+    ping_timeout=int(os.environ.get('PING_TIMEOUT', '20')),
+    max_http_buffer_size=int(os.environ.get('MAX_HTTP_BUFFER_SIZE', '100000')),
+)
+
+templates = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')),
+    autoescape=select_autoescape(['html'])
+)
+
+async_engine = None
+flush_task = None
+reaper_task = None
+broadcast_task = None
+round_timer_task = None
+
+# As salas são carregadas pelo próprio servidor, com await, antes do handler
+room_store.autoload = False
+
+
+async def load_room(room_id):
+    """Carrega a sala do banco para a memória, se ainda não estiver lá"""
+    if room_id in room_store.rooms or not sharding.owns(room_id):
+        return
+
+    with metrics.timed_task('room_load'):
+        async with async_engine.connect() as conn:
+            room = await conn.run_sync(lambda sync_conn: read_room(sync_conn, room_id))
+    if room:
+        room_store.install(room)
+
+
+def read_room(sync_conn, room_id):
+    with Session(bind=sync_conn) as db:
+        return room_store.read_room(db, room_id)
+
+
+async def flush():
+    batches = room_store.take_batches()
+    if not batches:
+        return 0
+
+    with metrics.timed_task('flush'):
+        async with async_engine.connect() as conn:
+            return await conn.run_sync(lambda sync_conn: write_batches(sync_conn, batches))
+
+
+def write_batches(sync_conn, batches):
+    with Session(bind=sync_conn) as db:
+        return room_store.write_batches(db, batches)
+
+
+async def flush_loop():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        await flush()
+
+
+async def reap():
+    """As mesmas etapas de reaper.reap(), com a varredura do banco pelo engine asyncpg"""
+    try:
+        transport = OutboxTransport(None)
+        with use_transport(transport):
+            report = reaper.reap_memory()
+        await transport.deliver(sio)
+
+        async with async_engine.connect() as conn:
+            swept = await conn.run_sync(sweep_database)
+
+        with use_transport(transport):
+            reaper.close_swept_rooms(swept.pop('room_ids'))
+        await transport.deliver(sio)
+
+        report.update(swept)
+        reaper.record(report)
+    except Exception:
+        log.exception('Erro no reaper')
+
+
+def sweep_database(sync_conn):
+    with Session(bind=sync_conn) as db:
+        return reaper.sweep_database(db)
+
+
+async def reaper_loop():
+    while True:
+        await asyncio.sleep(reaper.REAPER_INTERVAL)
+        with metrics.timed_task('reaper'):
+            await reap()
+
+
+async def broadcast_loop():
+    """Envia as mensagens agrupadas por sala quando a janela termina"""
+    while True:
+        await asyncio.sleep(coalescer.window / 2)
+        transport = OutboxTransport(None)
+        if coalescer.flush_due(transport):
+            await transport.deliver(sio)
+
+
+async def round_timer_loop():
+    """Um único loop para o tempo de todas as salas: dorme até o próximo prazo"""
+    while True:
+        await asyncio.sleep(round_scheduler.seconds_until_next())
+        if round_scheduler.due():
+            transport = OutboxTransport(None)
+            with use_transport(transport), metrics.timed_task('round_timer'):
+                auto_stop_rounds()
+            await transport.deliver(sio)
+
+
+def async_handler(handler):
+    async def dispatch(sid, *args):
+        data = args[0] if args else None
+        room_id = data.get('room_id') if isinstance(data, dict) else None
+        if isinstance(room_id, str) and room_id:
+            await load_room(room_id.upper())
+
+        transport = OutboxTransport(sid)
+        with use_transport(transport):
+            result = handler(*args)
+        await transport.deliver(sio)
+        return result
+    return dispatch
+
+
+for event_name, event_handler in EVENT_HANDLERS.items():
+    sio.on(event_name, async_handler(event_handler))
+
+
+# ==================== HTTP ====================
+
+async def send_response(send, status, body, content_type):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body.encode()})
+
+
+async def pages(scope, receive, send):
+    """Páginas e rotas de depuração (as mesmas do app.py)"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    path = scope['path'].rstrip('/') or '/'
+    if path == '/':
+        await send_response(send, 200, templates.get_template('index.html').render(), 'text/html; charset=utf-8')
+    elif path.startswith('/room/') and path.count('/') == 2:
+        room_id = path[len('/room/'):]
+        await send_response(send, 200, templates.get_template('room.html').render(room_id=room_id),
+                            'text/html; charset=utf-8')
+    elif path == '/metrics':
+        await send_response(send, 200, metrics.render(), metrics.CONTENT_TYPE)
+    elif path == '/debug/queries':
+        await send_response(send, 200, json.dumps(event_query_stats), 'application/json')
+    elif path == '/debug/reaper':
+        await send_response(send, 200, json.dumps(reaper.reaper_stats), 'application/json')
+    elif path == '/debug/broadcasts':
+        await send_response(send, 200, json.dumps(broadcast_stats), 'application/json')
+    elif path == '/debug/pool':
+        await send_response(send, 200, json.dumps(pool_stats(async_engine.sync_engine)), 'application/json')
+    elif path.startswith('/debug/rooms/') and path.endswith('/logging') and scope['method'] in ('POST', 'DELETE'):
+        # Liga (POST) ou desliga (DELETE) o despejo de depuração de uma sala
+        room_id = path.split('/')[3]
+        if scope['method'] == 'POST':
+            enable_room_debug(room_id)
+        else:
+            disable_room_debug(room_id)
+        await send_response(send, 200, json.dumps({'debug_rooms': debug_rooms()}), 'application/json')
+    else:
+        await send_response(send, 404, 'Not Found', 'text/plain')
+
+
+async def lifespan(receive, send):
+    global async_engine, flush_task, reaper_task, broadcast_task, round_timer_task
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Migrações pelo engine síncrono, antes de aceitar conexões
+            init_db()
+            async_engine = create_async_db_engine()
+            metrics.register_collector('adedonha_db_pool', lambda: pool_stats(async_engine.sync_engine))
+            metrics.register_collector('adedonha_db', lambda: query_totals, 'counter')
+            metrics.register_collector('adedonha_writes', lambda: write_stats, 'counter')
+            metrics.register_collector('adedonha_reaper', lambda: reaper.reaper_stats, 'counter')
+            metrics.register_collector('adedonha_broadcast', lambda: broadcast_stats, 'counter')
+            metrics.register_collector('adedonha_dictionary', lambda: dictionary_stats, 'counter')
+            metrics.register_collector('adedonha_round_timer', lambda: round_timer_stats, 'counter')
+            metrics.register_collector('adedonha_round_timer', lambda: {'pending': round_scheduler.pending()})
+            flush_task = asyncio.create_task(flush_loop())
+            reaper_task = asyncio.create_task(reaper_loop())
+            if coalescer.enabled:
+                broadcast_task = asyncio.create_task(broadcast_loop())
+            if round_scheduler.enabled:
+                round_timer_task = asyncio.create_task(round_timer_loop())
+            log.info('✓ Banco de dados conectado (asyncpg)')
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Desligamento gracioso: gravar o estado pendente das salas
+            log.info('🛑 Encerrando: gravando estado pendente das salas')
+            flush_task.cancel()
+            reaper_task.cancel()
+            if broadcast_task:
+                broadcast_task.cancel()
+            if round_timer_task:
+                round_timer_task.cancel()
+            await flush()
+            await async_engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+app = socketio.ASGIApp(sio, other_asgi_app=pages)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get('PORT', 5000))
+    log.info('🎮 Servidor Adedonha (asyncio + asyncpg) rodando', url=f'http://localhost:{port}')
+    # O uvicorn trata o SIGTERM: para de aceitar conexões e roda o shutdown do lifespan
+    uvicorn.run(app, host='0.0.0.0', port=port, log_level='warning', lifespan='on')
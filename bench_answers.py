@@ -0,0 +1,183 @@
+"""
+Benchmark da tabela de respostas: tabela única (schema até a migração 5) x
+particionada por dia (migração 6)
+
+Cria as duas versões num schema temporário (bench_answers), com o mesmo volume
+(`--days` dias x `--rooms` salas por dia x 4 jogadores x `--rounds` rodadas x 6
+categorias), e mede:
+
+- leitura da rodada (a consulta do carregamento da sala), média em `--reads` salas;
+- limpeza do dia mais antigo: DELETE + VACUUM na tabela única x DROP TABLE da
+  partição, com o tamanho em disco antes e depois.
+
+O schema é apagado no fim. Uso:
+    python bench_answers.py --days 7 --rooms 2000 --rounds 10
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from database import engine
+
+SCHEMA = 'bench_answers'
+PLAYERS = 4
+CATEGORIES = ['Nome', 'Animal', 'Cidade', 'Objeto', 'Cor', 'Comida']
+
+SETUP = [
+    f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE',
+    f'CREATE SCHEMA {SCHEMA}',
+    # Como era antes da migração 6: id serial, chave única e índice (room_id, round)
+    f"""
+    CREATE TABLE {SCHEMA}.flat (
+        id SERIAL PRIMARY KEY,
+        room_id VARCHAR(8) NOT NULL,
+        player_id VARCHAR(50) NOT NULL,
+        round INTEGER NOT NULL,
+        category VARCHAR(50) NOT NULL,
+        created_on DATE NOT NULL,
+        answer VARCHAR(100),
+        points FLOAT,
+        invalidated BOOLEAN,
+        validation_state VARCHAR(10)
+    )
+    """,
+    f'CREATE UNIQUE INDEX ON {SCHEMA}.flat (room_id, player_id, round, category)',
+    f'CREATE INDEX ON {SCHEMA}.flat (room_id, round)',
+    # Como na migração 6
+    f"""
+    CREATE TABLE {SCHEMA}.parted (
+        room_id VARCHAR(8) NOT NULL,
+        match_number INTEGER NOT NULL DEFAULT 1,
+        round INTEGER NOT NULL,
+        player_id VARCHAR(50) NOT NULL,
+        category VARCHAR(50) NOT NULL,
+        created_on DATE NOT NULL,
+        answer VARCHAR(100),
+        points FLOAT,
+        invalidated BOOLEAN,
+        validation_state VARCHAR(10),
+        PRIMARY KEY (room_id, match_number, round, player_id, category, created_on)
+    ) PARTITION BY RANGE (created_on)
+    """,
+]
+
+# Volume: sala 'D<dia>R<n>' criada no dia `current_date - dia`
+FILL = """
+    INSERT INTO {table} (room_id, player_id, round, category, created_on, answer, points, invalidated, validation_state)
+    SELECT 'D' || d || 'R' || r, 'p' || d || '-' || r || '-' || p, rnd, c, current_date - d,
+           'Resposta', 10, false, 'valid'
+    FROM generate_series(0, :days - 1) d, generate_series(1, :rooms) r,
+         generate_series(1, {players}) p, generate_series(1, :rounds) rnd,
+         unnest(CAST(:categories AS text[])) c
+"""
+
+
+def day_partition(day_offset):
+    return f'{SCHEMA}.parted_d{day_offset}'
+
+
+def setup(conn, days, rooms, rounds):
+    for statement in SETUP:
+        conn.execute(text(statement))
+    for d in range(days):
+        conn.execute(text(
+            f'CREATE TABLE {day_partition(d)} PARTITION OF {SCHEMA}.parted '
+            f"FOR VALUES FROM (current_date - {d}) TO (current_date - {d} + 1)"
+        ))
+    params = {'days': days, 'rooms': rooms, 'rounds': rounds, 'categories': CATEGORIES}
+    for table in ('flat', 'parted'):
+        conn.execute(text(FILL.format(table=f'{SCHEMA}.{table}', players=PLAYERS)), params)
+        conn.execute(text(f'ANALYZE {SCHEMA}.{table}'))
+
+
+def table_size(conn, table):
+    """Tamanho em disco (bytes) da tabela e índices, somando as partições"""
+    return conn.execute(text(
+        'SELECT pg_total_relation_size(CAST(:table AS regclass)) + COALESCE(('
+        '    SELECT SUM(pg_total_relation_size(relid)) FROM pg_partition_tree(CAST(:table AS regclass))'
+        '    WHERE relid <> CAST(:table AS regclass)), 0)'
+    ), {'table': f'{SCHEMA}.{table}'}).scalar()
+
+
+def measure_reads(conn, days, rooms, rounds, reads):
+    """Milissegundos médios da leitura de uma rodada em cada tabela"""
+    samples = [(random.randrange(days), random.randint(1, rooms), random.randint(1, rounds)) for _ in range(reads)]
+    # O servidor conhece o created_on da sala: a data vai como parâmetro (poda da partição no plano)
+    today = conn.execute(text('SELECT current_date')).scalar()
+    queries = {
+        'flat': text(f'SELECT * FROM {SCHEMA}.flat WHERE room_id = :room AND round = :round'),
+        'parted': text(f'SELECT * FROM {SCHEMA}.parted WHERE created_on = :created_on '
+                       'AND room_id = :room AND match_number = 1 AND round = :round'),
+    }
+    results = {}
+    for table, query in queries.items():
+        started = time.perf_counter()
+        for day, room, rnd in samples:
+            conn.execute(query, {'created_on': today - timedelta(days=day), 'room': f'D{day}R{room}',
+                                 'round': rnd}).all()
+        results[table] = (time.perf_counter() - started) * 1000 / reads
+    return results
+
+
+def measure_cleanup(conn, oldest_day):
+    """Segundos para livrar o disco das respostas do dia mais antigo em cada tabela"""
+    results = {}
+
+    size_before = table_size(conn, 'flat')
+    started = time.perf_counter()
+    deleted = conn.execute(text(
+        f'DELETE FROM {SCHEMA}.flat WHERE created_on = current_date - :day'), {'day': oldest_day}).rowcount
+    delete_time = time.perf_counter() - started
+    size_after_delete = table_size(conn, 'flat')
+    started = time.perf_counter()
+    conn.execute(text(f'VACUUM {SCHEMA}.flat'))
+    vacuum_time = time.perf_counter() - started
+    results['flat'] = {
+        'rows': deleted, 'seconds': delete_time, 'vacuum_seconds': vacuum_time,
+        'size_before': size_before, 'size_after': size_after_delete,
+    }
+
+    size_before = table_size(conn, 'parted')
+    started = time.perf_counter()
+    conn.execute(text(f'DROP TABLE {day_partition(oldest_day)}'))
+    results['parted'] = {
+        'rows': deleted, 'seconds': time.perf_counter() - started, 'vacuum_seconds': 0.0,
+        'size_before': size_before, 'size_after': table_size(conn, 'parted'),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Respostas: tabela única x particionada por dia')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--rooms', type=int, default=2000, help='salas por dia')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--reads', type=int, default=2000)
+    args = parser.parse_args()
+
+    # autocommit: o VACUUM não roda dentro de transação
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        try:
+            setup(conn, args.days, args.rooms, args.rounds)
+            reads = measure_reads(conn, args.days, args.rooms, args.rounds, args.reads)
+            cleanup = measure_cleanup(conn, args.days - 1)
+        finally:
+            conn.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+
+    mb = 1024 * 1024
+    print()
+    print(f'{"tabela":>12} {"leitura (ms)":>13} {"limpeza (s)":>12} {"vacuum (s)":>11} '
+          f'{"MB antes":>9} {"MB depois":>10}')
+    for table, label in (('flat', 'única'), ('parted', 'particionada')):
+        c = cleanup[table]
+        print(f'{label:>12} {reads[table]:>13.3f} {c["seconds"]:>12.3f} {c["vacuum_seconds"]:>11.3f} '
+              f'{c["size_before"] / mb:>9.1f} {c["size_after"] / mb:>10.1f}')
+    print(f'\n{cleanup["flat"]["rows"]} respostas do dia mais antigo; '
+          f'na tabela única o espaço só volta a ser reutilizável depois do VACUUM')
+
+
+if __name__ == '__main__':
+    main()
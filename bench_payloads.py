@@ -0,0 +1,114 @@
+"""
+Benchmark dos payloads do fim da rodada: json (original) x columnar (payloads.py)
+
+Monta uma sala em memória com `--players` jogadores e `--categories` categorias,
+preenche as respostas (parte repetida, parte com letra errada, parte vazia), roda
+a validação automática e a pontuação como o stop_game e o calculate_scores, e
+mede para game_stopped e scores_calculated:
+
+- bytes do pacote Socket.IO (o que vai para cada cliente) e comprimido com zlib
+  (aproximação do permessage-deflate, quando o proxy/cliente negociam);
+- CPU do servidor para montar o payload e serializar o pacote (média em `--iterations`).
+
+Não usa o banco nem a rede. Uso:
+    python bench_payloads.py --players 50 --categories 15
+"""
+import argparse
+import random
+import time
+import zlib
+
+from socketio import packet
+
+from room_state import RoomState, PlayerState, AnswerState
+from validation import RoundValidation
+from scoring import score_round
+from payloads import ENCODERS, ENCODINGS
+
+WORDS = ['Abacate', 'Abelha', 'Amarelo', 'Amapá', 'Anel', 'Alface', 'Azul', 'Arara', 'Aveia', 'Apito']
+
+
+def build_room(players, categories):
+    room = RoomState('BENCH001', host_id=None, game_state='validation', current_round=3,
+                     current_letter='A', categories=[f'Categoria {i + 1}' for i in range(categories)])
+    for i in range(players):
+        player_id = f'{random.getrandbits(80):020x}'
+        room.players[player_id] = PlayerState(player_id, f'Jogador {i + 1}', score=random.randint(0, 300),
+                                              is_host=(i == 0))
+    room.host_id = next(iter(room.players))
+
+    for player_id in room.players:
+        for category in room.categories:
+            roll = random.random()
+            if roll < 0.1:
+                text = ''
+            elif roll < 0.2:
+                text = 'Banana'  # letra errada
+            elif roll < 0.5:
+                text = random.choice(WORDS)  # tende a repetir
+            else:
+                text = f'{random.choice(WORDS)} {random.getrandbits(24):x}'
+            room.answers[(player_id, category)] = AnswerState(player_id, category, text)
+    return room
+
+
+def frame(event, payload):
+    return packet.Packet(packet.EVENT, data=[event, payload]).encode().encode('utf-8')
+
+
+def measure(room, iterations):
+    answers = list(room.answers.values())
+    room.validation = RoundValidation(answers, room.categories, room.current_letter)
+    marks = room.validation.auto_validate(answers)
+    scores, results = score_round(answers, room.categories, room.current_letter, room.players,
+                                  validation=room.validation)
+    for ans, points, _ in results:
+        ans.points = points
+
+    args = {
+        'game_stopped': ('Jogador 1', room.host_id, *marks),
+        'scores_calculated': (scores, results),
+    }
+    measurements = {}
+    for event, event_args in args.items():
+        for encoding in ENCODINGS:
+            encoder = ENCODERS[event][encoding]
+            data = frame(event, encoder(room, *event_args))
+            started = time.perf_counter()
+            for _ in range(iterations):
+                frame(event, encoder(room, *event_args))
+            measurements[(event, encoding)] = {
+                'bytes': len(data),
+                'deflated': len(zlib.compress(data)),
+                'ms': (time.perf_counter() - started) * 1000 / iterations,
+            }
+    return measurements
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Payloads do fim da rodada: json x columnar')
+    parser.add_argument('--players', type=int, default=50)
+    parser.add_argument('--categories', type=int, default=15)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(1)
+    room = build_room(args.players, args.categories)
+    results = measure(room, args.iterations)
+
+    print()
+    print(f'{"evento":>18} {"codificação":>12} {"bytes":>8} {"zlib":>7} {"CPU (ms)":>9}')
+    for (event, encoding), r in results.items():
+        print(f'{event:>18} {encoding:>12} {r["bytes"]:>8} {r["deflated"]:>7} {r["ms"]:>9.3f}')
+
+    print(f'\nPor rodada ({args.players} jogadores x {args.categories} categorias, '
+          f'game_stopped + scores_calculated para cada cliente):')
+    for encoding in ENCODINGS:
+        per_client = sum(results[(event, encoding)]['bytes'] for event in ENCODERS)
+        cpu = sum(results[(event, encoding)]['ms'] for event in ENCODERS)
+        print(f'{encoding:>12}: {per_client} bytes por cliente, {per_client * args.players / 1024:.1f} KB '
+              f'para a sala, {cpu:.3f} ms de CPU no servidor')
+
+
+if __name__ == '__main__':
+    main()
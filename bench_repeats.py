@@ -0,0 +1,149 @@
+"""
+Benchmark das repetidas: exato x sugestões de quase iguais (validation.fuzzy_groups)
+
+Monta uma sala em memória com `--players` jogadores e `--categories` categorias.
+Cada resposta sai de um vocabulário por categoria (as palavras comuns se
+repetem) e, com probabilidade `--typo-rate`, ganha um erro de digitação (troca,
+inserção, remoção ou inversão de letras). Mede, em média em `--iterations`:
+
+- tempo da validação do stop (RoundValidation + auto_validate) sem e com as
+  sugestões de quase iguais, e com uma versão ingênua que compara todos os pares;
+- respostas com erro de digitação sugeridas para a palavra certa e respostas de
+  palavras diferentes sugeridas como parecidas (o anfitrião recusaria).
+
+Não usa o banco nem a rede. Uso:
+    python bench_repeats.py --players 100 --categories 15
+"""
+import argparse
+import random
+import string
+import time
+
+import validation
+from room_state import AnswerState
+from validation import RoundValidation, one_edit_apart
+
+LETTER = 'a'
+SYLLABLES = ['ba', 'ca', 'da', 'fa', 'ga', 'la', 'ma', 'na', 'pa', 'ra', 'sa', 'ta', 've', 'lo', 'ri', 'tu', 'ne']
+
+
+def make_vocabulary(size):
+    words = set()
+    while len(words) < size:
+        words.add(LETTER + ''.join(random.choice(SYLLABLES) for _ in range(random.randint(2, 4))))
+    return sorted(words)
+
+
+def make_typo(word):
+    i = random.randrange(1, len(word))  # a primeira letra fica (é a letra da rodada)
+    kind = random.choice(('replace', 'insert', 'delete', 'swap'))
+    if kind == 'replace':
+        return word[:i] + random.choice(string.ascii_lowercase) + word[i + 1:]
+    if kind == 'insert':
+        return word[:i] + random.choice(string.ascii_lowercase) + word[i:]
+    if kind == 'delete' or i == len(word) - 1:
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def build_round(players, categories, vocabulary_size, typo_rate):
+    """Respostas da rodada e {(player_id, categoria): palavra de origem}"""
+    category_names = [f'Categoria {i + 1}' for i in range(categories)]
+    answers = []
+    sources = {}
+    for category in category_names:
+        vocabulary = make_vocabulary(vocabulary_size)
+        weights = [1 / (rank + 1) for rank in range(len(vocabulary))]  # poucas palavras muito comuns
+        for i in range(players):
+            player_id = f'p{i}'
+            word = random.choices(vocabulary, weights)[0]
+            text = make_typo(word) if random.random() < typo_rate else word
+            answers.append(AnswerState(player_id, category, text))
+            sources[(player_id, category)] = word
+    return answers, category_names, sources
+
+
+def all_pairs_groups(counts):
+    """Mesmo resultado de fuzzy_groups comparando cada chave com todas as chaves de grupo"""
+    grouped = {}
+    groups = []
+    for key in sorted(counts, key=lambda k: (-counts[k], k)):
+        match = None
+        if len(key) >= validation.FUZZY_MIN_LENGTH:
+            match = next((g for g in groups if g[0] == key[0] and one_edit_apart(key, g)), None)
+        if match:
+            grouped[key] = (match, round(1 - 1 / max(len(key), len(match)), 2))
+        else:
+            grouped[key] = (key, 1.0)
+            if len(key) >= validation.FUZZY_MIN_LENGTH:
+                groups.append(key)
+    return grouped
+
+
+def run_validation(answers, categories, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for ans in answers:
+            ans.invalidated, ans.validation_state = False, 'valid'
+        result = RoundValidation(answers, categories, LETTER)
+        result.auto_validate(answers)
+    return result, (time.perf_counter() - started) * 1000 / iterations
+
+
+def suggested_key(result, ans):
+    """Chave do grupo se o anfitrião aceitasse todas as sugestões"""
+    return result.suggestions.get((ans.category, ans.answer_key), (ans.answer_key,))[0]
+
+
+def grouping_quality(result, answers, sources):
+    """(erros de digitação sugeridos para a palavra certa, total de erros, sugestões erradas)"""
+    group_source = {}
+    for ans in answers:
+        if ans.answer_key == sources[(ans.player_id, ans.category)]:
+            group_source[(ans.category, suggested_key(result, ans))] = ans.answer_key
+    caught = typos = wrong = 0
+    for ans in answers:
+        source = sources[(ans.player_id, ans.category)]
+        expected = group_source.get((ans.category, suggested_key(result, ans)), suggested_key(result, ans))
+        if ans.answer_key != source:
+            typos += 1
+            caught += expected == source
+        elif expected != source:
+            wrong += 1
+    return caught, typos, wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Repetidas: exato x quase iguais')
+    parser.add_argument('--players', type=int, default=100)
+    parser.add_argument('--categories', type=int, default=15)
+    parser.add_argument('--vocabulary', type=int, default=60, help='palavras por categoria')
+    parser.add_argument('--typo-rate', type=float, default=0.15)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(1)
+    answers, categories, sources = build_round(args.players, args.categories, args.vocabulary, args.typo_rate)
+
+    fuzzy_groups = validation.fuzzy_groups
+    modes = {}
+    validation.FUZZY_REPEATS = False
+    modes['exato'] = run_validation(answers, categories, args.iterations)
+    validation.FUZZY_REPEATS = True
+    modes['sugestões'] = run_validation(answers, categories, args.iterations)
+    validation.fuzzy_groups = all_pairs_groups
+    modes['todos os pares'] = run_validation(answers, categories, args.iterations)
+    validation.fuzzy_groups = fuzzy_groups
+
+    print()
+    print(f'{"repetidas":>15} {"ms por stop":>12} {"grupos":>7} {"erros sugeridos":>16} {"erradas":>9}')
+    for mode, (result, ms) in modes.items():
+        caught, typos, wrong = grouping_quality(result, answers, sources)
+        groups = len({(ans.category, suggested_key(result, ans)) for ans in result.answered})
+        print(f'{mode:>15} {ms:>12.3f} {groups:>7} {caught:>7}/{typos:<8} {wrong:>9}')
+    print(f'\n{args.players} jogadores x {args.categories} categorias, {args.vocabulary} palavras por '
+          f'categoria, {args.typo_rate:.0%} com erro de digitação')
+
+
+if __name__ == '__main__':
+    main()
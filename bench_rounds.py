@@ -0,0 +1,309 @@
+"""
+Benchmark de rodadas completas: latência por evento, vazão e consultas ao banco
+
+Sobe um servidor (`python app.py` ou asgi_app.py) com o DATABASE_URL do
+ambiente e joga `--rooms` salas simultâneas de `--players` clientes
+python-socketio, com a mesma sequência de eventos do room.html:
+
+    create_room, join_room, join_socketio_room (token + codificação),
+    update_categories e, a cada rodada, start_round, submit_answers,
+    stop_game, invalidate_answer, calculate_scores, next_round; no fim close_room.
+
+A latência é medida até a resposta que o próprio jogador recebe (REPLIES: o
+room_created do create_room, o round_starting do start_round...); os eventos
+sem resposta vão com ack (client.call). Um ack logo depois da resposta
+esperaria o ACK atrasado do TCP (~40 ms, Nagle), e o navegador não pede ack.
+Relata p50/p95/p99 por evento, eventos por segundo e consultas ao banco por
+rodada (adedonha_db_queries_total do /metrics, que inclui a
+gravação em lote e a carga das salas).
+
+Cada medição é a mediana de `--runs` execuções (servidor novo em cada uma): o
+p95 de um evento numa execução só varia demais para servir de comparação.
+
+Com `--baseline` compara com uma medição salva (bench_rounds_baseline.json) e
+termina com código 1 se passar da tolerância; `--save-baseline` grava a medição.
+
+Uso:
+    python bench_rounds.py --rooms 20 --players 6 --rounds 5 --runs 3
+    python bench_rounds.py --baseline bench_rounds_baseline.json
+    python bench_rounds.py --save-baseline bench_rounds_baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from multiprocessing import Pool
+from statistics import median
+
+from bench_server import RUNNERS, percentile
+from loadtest import SimulatedPlayer, wait_for_port, EVENT_TIMEOUT
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CATEGORIES = ['Nome', 'Animal', 'Cidade', 'Objeto', 'Cor', 'Fruta']
+ENCODING = 'columnar'
+
+# Variação aceita em relação à linha de base: a latência pode subir até
+# (1 + tolerância) x base + LATENCY_SLACK_MS; vazão e consultas por rodada só a tolerância
+LATENCY_SLACK_MS = 2.0
+
+# O que a comparação com a linha de base verifica: p50 e p95 de cada evento com
+# pelo menos MIN_SAMPLES medidas e p50, p95 e p99 de todos juntos. O p99 de cada
+# evento (poucas medidas acima dele) só é relatado.
+ALL_EVENTS = 'todos'
+MIN_SAMPLES = 50
+GATED = ('p50', 'p95')
+GATED_ALL = ('p50', 'p95', 'p99')
+
+# {evento: resposta que o jogador que mandou recebe}
+REPLIES = {
+    'create_room': 'room_created',
+    'join_room': 'room_joined',
+    'update_categories': 'categories_updated',
+    'start_round': 'round_starting',
+    'stop_game': 'game_stopped',
+    'calculate_scores': 'scores_calculated',
+    'next_round': 'ready_for_next_round',
+    'close_room': 'room_closed',
+}
+
+
+def new_player(url):
+    return SimulatedPlayer(url, events=('categories_updated', 'room_closed'))
+
+
+def timed_call(player, samples, event, data):
+    """Manda o evento e retorna a resposta (ou None, para os eventos com ack)"""
+    started = time.perf_counter()
+    reply = REPLIES.get(event)
+    if reply:
+        player.client.emit(event, data)
+        result = player.wait(reply)
+    else:
+        result = player.client.call(event, data, timeout=EVENT_TIMEOUT)
+    samples.setdefault(event, []).append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def play_room(args):
+    """Joga uma sala inteira e retorna {evento: [latências em ms]}"""
+    url, players, rounds = args
+    samples = {}
+
+    host = new_player(url)
+    created = timed_call(host, samples, 'create_room', {'player_name': 'Host', 'encoding': ENCODING})
+    room_id = created['room_id']
+    tokens = {host: created['player_token']}
+    names = {host: 'Host'}
+
+    guests = []
+    player_ids = []
+    for i in range(players - 1):
+        guest = new_player(url)
+        names[guest] = f'Jogador {i}'
+        joined = timed_call(guest, samples, 'join_room',
+                            {'room_id': room_id, 'player_name': names[guest], 'encoding': ENCODING})
+        tokens[guest] = joined['player_token']
+        player_ids.append(joined['player']['id'])
+        guests.append(guest)
+    everyone = [host] + guests
+
+    # O room.html manda o join_socketio_room ao abrir a página da sala
+    for player in everyone:
+        timed_call(player, samples, 'join_socketio_room', {
+            'room_id': room_id, 'player_name': names[player],
+            'player_token': tokens[player], 'encoding': ENCODING,
+        })
+
+    timed_call(host, samples, 'update_categories', {'room_id': room_id, 'categories': CATEGORIES})
+    for player in guests:
+        player.wait('categories_updated')
+
+    for _ in range(rounds):
+        letter = timed_call(host, samples, 'start_round', {'room_id': room_id})['letter']
+        for player in guests:
+            player.wait('round_starting')
+
+        for player in everyone:
+            answers = [random.choice([letter, 'B']) + 'teste' for _ in CATEGORIES]
+            timed_call(player, samples, 'submit_answers', {'room_id': room_id, 'answers': answers})
+
+        timed_call(host, samples, 'stop_game', {'room_id': room_id})
+        for player in guests:
+            player.wait('game_stopped')
+
+        if player_ids:
+            timed_call(host, samples, 'invalidate_answer', {
+                'room_id': room_id, 'player_id': random.choice(player_ids),
+                'category_index': random.randrange(len(CATEGORIES)),
+            })
+
+        timed_call(host, samples, 'calculate_scores', {'room_id': room_id})
+        for player in guests:
+            player.wait('scores_calculated')
+
+        timed_call(host, samples, 'next_round', {'room_id': room_id})
+        for player in guests:
+            player.wait('ready_for_next_round')
+
+    timed_call(host, samples, 'close_room', {'room_id': room_id})
+    for player in everyone:
+        player.client.disconnect()
+    return samples
+
+
+def db_queries(url):
+    """Total de consultas do processo do servidor (adedonha_db_queries_total)"""
+    with urllib.request.urlopen(f'{url}/metrics', timeout=EVENT_TIMEOUT) as response:
+        for line in response.read().decode('utf-8').splitlines():
+            if line.startswith('adedonha_db_queries_total '):
+                return float(line.split()[1])
+    return 0.0
+
+
+def run(runner, rooms, players, rounds, port):
+    env = dict(os.environ, PORT=str(port))
+    server = subprocess.Popen(RUNNERS[runner], env=env, cwd=APP_DIR,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_for_port(port)
+        queries_before = db_queries(url)
+
+        started = time.perf_counter()
+        with Pool(rooms) as pool:
+            results = pool.map(play_room, [(url, players, rounds)] * rooms)
+        elapsed = time.perf_counter() - started
+
+        # Esperar a gravação em lote das últimas rodadas (FLUSH_INTERVAL)
+        time.sleep(float(os.environ.get('FLUSH_INTERVAL', '0.5')) * 3)
+        queries = db_queries(url) - queries_before
+    finally:
+        server.terminate()
+        server.wait()
+
+    samples = {}
+    for room_samples in results:
+        for event, latencies in room_samples.items():
+            samples.setdefault(event, []).extend(latencies)
+            samples.setdefault(ALL_EVENTS, []).extend(latencies)
+
+    total = len(samples[ALL_EVENTS])
+    return {
+        'config': {'runner': runner, 'rooms': rooms, 'players': players, 'rounds': rounds},
+        'events': total,
+        'elapsed': elapsed,
+        'events_per_sec': total / elapsed,
+        'queries_per_round': queries / (rooms * rounds),
+        'latency_ms': {
+            event: {
+                'count': len(latencies),
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+            }
+            for event, latencies in samples.items()
+        },
+    }
+
+
+def combine(results):
+    """Mediana das execuções, métrica por métrica"""
+    combined = {
+        'config': results[0]['config'],
+        'events': results[0]['events'],
+        'runs': len(results),
+    }
+    for key in ('elapsed', 'events_per_sec', 'queries_per_round'):
+        combined[key] = median(r[key] for r in results)
+    combined['latency_ms'] = {
+        event: {
+            'count': latencies['count'],
+            **{p: median(r['latency_ms'][event][p] for r in results) for p in ('p50', 'p95', 'p99')},
+        }
+        for event, latencies in results[0]['latency_ms'].items()
+    }
+    return combined
+
+
+def regressions(result, baseline, tolerance):
+    """Lista das métricas piores que a linha de base além da tolerância"""
+    found = []
+    if result['config'] != baseline['config']:
+        found.append(f'configuração diferente da linha de base: {baseline["config"]}')
+        return found
+
+    if result['events_per_sec'] < baseline['events_per_sec'] * (1 - tolerance):
+        found.append(f'eventos/s: {result["events_per_sec"]:.1f} (base {baseline["events_per_sec"]:.1f})')
+    if result['queries_per_round'] > baseline['queries_per_round'] * (1 + tolerance):
+        found.append(f'consultas por rodada: {result["queries_per_round"]:.1f} '
+                     f'(base {baseline["queries_per_round"]:.1f})')
+    for event, base in baseline['latency_ms'].items():
+        current = result['latency_ms'].get(event)
+        if current is None:
+            found.append(f'{event}: não foi medido')
+            continue
+        if event != ALL_EVENTS and base['count'] < MIN_SAMPLES:
+            continue
+        for key in GATED_ALL if event == ALL_EVENTS else GATED:
+            limit = base[key] * (1 + tolerance) + LATENCY_SLACK_MS
+            if current[key] > limit:
+                found.append(f'{event} {key}: {current[key]:.2f} ms (base {base[key]:.2f} ms)')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rodadas completas: latência por evento, vazão e consultas')
+    parser.add_argument('--runner', choices=sorted(RUNNERS), default='dev')
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--players', type=int, default=6)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--runs', type=int, default=3, help='execuções (a medição é a mediana)')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('BENCH_PORT', '5351')))
+    parser.add_argument('--baseline', help='JSON salvo com --save-baseline para comparar')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='piora aceita em relação à linha de base (0.25 = 25%%)')
+    parser.add_argument('--save-baseline', help='grava a medição neste arquivo JSON')
+    args = parser.parse_args()
+
+    # A configuração da linha de base manda (mesmas salas, jogadores e rodadas)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        config = baseline['config']
+        args.runner, args.rooms = config['runner'], config['rooms']
+        args.players, args.rounds = config['players'], config['rounds']
+        args.runs = baseline.get('runs', args.runs)
+
+    result = combine([run(args.runner, args.rooms, args.players, args.rounds, args.port)
+                      for _ in range(args.runs)])
+
+    print()
+    print(f'{"evento":>20} {"qtd":>6} {"p50 (ms)":>9} {"p95 (ms)":>9} {"p99 (ms)":>9}')
+    for event, r in sorted(result['latency_ms'].items(), key=lambda item: (item[0] == ALL_EVENTS, item[0])):
+        print(f'{event:>20} {r["count"]:>6} {r["p50"]:>9.2f} {r["p95"]:>9.2f} {r["p99"]:>9.2f}')
+    print(f'\n{result["events"]} eventos em {result["elapsed"]:.2f}s: {result["events_per_sec"]:.1f} eventos/s, '
+          f'{result["queries_per_round"]:.1f} consultas ao banco por rodada (mediana de {result["runs"]} execuções)')
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Linha de base gravada em {args.save_baseline}')
+
+    if args.baseline:
+        found = regressions(result, baseline, args.tolerance)
+        if found:
+            print(f'\nRegressão em relação a {args.baseline} (tolerância {args.tolerance:.0%}):')
+            for line in found:
+                print(f'  - {line}')
+            sys.exit(1)
+        print(f'\nDentro da linha de base ({args.baseline}, tolerância {args.tolerance:.0%})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark da pontuação: scoring.score_round x o laço antigo do calculate_scores
+
+O laço antigo (até o scoring.py) percorria todas as respostas da rodada uma vez
+por categoria, O(categorias x respostas). Monta uma sala em memória com
+`--players` jogadores e `--categories` categorias (respostas em branco, com letra
+errada, invalidadas, com meio ponto, únicas e repetidas) e mede, em média em
+`--iterations`:
+
+- o laço antigo;
+- score_round com a RoundValidation já pronta (como no calculate_scores, que usa
+  a validação calculada no stop_game);
+- score_round montando a validação.
+
+Confere que as duas versões dão os mesmos pontos e motivos para cada resposta e
+os mesmos totais por jogador; termina com erro se não derem. As respostas são
+ASCII, em que a comparação antiga (lower) e a chave normalizada coincidem.
+
+Não usa o banco nem a rede. Uso:
+    python bench_scoring.py --players 50 --categories 20
+"""
+import argparse
+import random
+import sys
+import time
+
+from room_state import AnswerState
+from scoring import score_round
+from validation import RoundValidation
+
+LETTER = 'B'
+SYLLABLES = ['ba', 'ca', 'da', 'fa', 'la', 'ma', 'na', 'ra', 'sa', 'to', 've', 'ri']
+
+
+def legacy_scores(answers, categories, current_letter, player_ids):
+    """O laço do calculate_scores antes do scoring.py: (scores, [(resposta, pontos, motivo)])"""
+    scores = dict.fromkeys(player_ids, 0)
+    results = []
+    for category in categories:
+        cat_answers = [a for a in answers if a.category == category]
+
+        answer_counts = {}
+        for ans in cat_answers:
+            if ans.answer and not ans.invalidated:
+                answer_counts.setdefault(ans.answer.lower(), []).append(ans.player_id)
+
+        for ans in cat_answers:
+            if not ans.answer:
+                points, reason = 0, 'blank'
+            elif ans.validation_state == 'invalid' or ans.invalidated:
+                points, reason = 0, 'invalidated'
+            elif ans.validation_state == 'half':
+                points, reason = 5, 'half_point'
+            elif not ans.answer.lower().startswith(current_letter.lower()):
+                points, reason = 0, 'wrong_letter'
+            elif len(answer_counts.get(ans.answer.lower(), [])) == 1:
+                points, reason = 10, 'unique'
+            else:
+                points, reason = 5, 'repeated'
+            scores[ans.player_id] = scores.get(ans.player_id, 0) + points
+            results.append((ans, points, reason))
+    return scores, results
+
+
+def build_round(players, categories, vocabulary_size):
+    category_names = [f'Categoria {i + 1}' for i in range(categories)]
+    player_ids = [f'p{i}' for i in range(players)]
+    answers = []
+    for category in category_names:
+        vocabulary = sorted({LETTER + ''.join(random.choice(SYLLABLES) for _ in range(random.randint(1, 3)))
+                             for _ in range(vocabulary_size)})
+        weights = [1 / (rank + 1) for rank in range(len(vocabulary))]  # poucas palavras muito comuns
+        for player_id in player_ids:
+            word = random.choices(vocabulary, weights)[0]
+            kind = random.random()
+            if kind < 0.10:
+                answers.append(AnswerState(player_id, category, ''))
+                continue
+            if kind < 0.15:
+                word = 'z' + word[1:]
+            ans = AnswerState(player_id, category, random.choice((word, word.capitalize())))
+            if 0.15 <= kind < 0.20:
+                ans.invalidated, ans.validation_state = True, 'invalid'
+            elif 0.20 <= kind < 0.25:
+                ans.validation_state = 'half'
+            answers.append(ans)
+    random.shuffle(answers)  # como room.answers depois de vários envios
+    return answers, category_names, player_ids
+
+
+def timed(run, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = run()
+    return result, (time.perf_counter() - started) * 1000 / iterations
+
+
+def by_answer(results):
+    return {(ans.player_id, ans.category): (points, reason) for ans, points, reason in results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pontuação: score_round x laço antigo')
+    parser.add_argument('--players', type=int, default=50)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--vocabulary', type=int, default=40, help='palavras por categoria')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(1)
+    answers, categories, player_ids = build_round(args.players, args.categories, args.vocabulary)
+    validation = RoundValidation(answers, categories, LETTER)
+
+    runs = {
+        'laço antigo': lambda: legacy_scores(answers, categories, LETTER, player_ids),
+        'score_round': lambda: score_round(answers, categories, LETTER, player_ids, validation),
+        'com validação': lambda: score_round(answers, categories, LETTER, player_ids),
+    }
+    measured = {name: timed(run, args.iterations) for name, run in runs.items()}
+
+    print()
+    print(f'{"pontuação":>15} {"ms por rodada":>14}')
+    for name, (_, ms) in measured.items():
+        print(f'{name:>15} {ms:>14.3f}')
+
+    reasons = {}
+    for points, reason in by_answer(measured['laço antigo'][0][1]).values():
+        reasons[reason] = reasons.get(reason, 0) + 1
+    print(f'\n{args.players} jogadores x {args.categories} categorias, {len(answers)} respostas: '
+          + ', '.join(f'{count} {reason}' for reason, count in sorted(reasons.items())))
+
+    expected_scores, expected_results = measured['laço antigo'][0]
+    for name in ('score_round', 'com validação'):
+        scores, results = measured[name][0]
+        if scores != expected_scores or by_answer(results) != by_answer(expected_results):
+            print(f'❌ {name} não dá os mesmos pontos que o laço antigo')
+            sys.exit(1)
+    print('✓ Mesmos pontos e motivos nas duas versões')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark do servidor: `python app.py` (desenvolvimento) x gunicorn (produção)
+x asgi_app.py (asyncio + asyncpg)
+
+Para cada runner, sobe o servidor, abre conexões Socket.IO até `--connections`
+(capacidade: quantas conectam dentro do timeout), mede a memória do servidor
+por conexão e a latência de ida e volta de um evento com ack em todas as
+conexões abertas (p50/p99 e eventos por segundo).
+
+Uso:
+    python bench_server.py --runners dev gunicorn asgi --connections 500 --calls 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import socketio
+
+from loadtest import wait_for_port
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+RUNNERS = {
+    'dev': [sys.executable, 'app.py'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+    'asgi': [sys.executable, 'asgi_app.py'],
+}
+
+CONNECT_TIMEOUT = 10
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def process_tree_rss(pid):
+    """Memória residente (bytes) do processo e dos filhos (workers do gunicorn). Apenas Linux."""
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return total
+
+
+def open_connection(url):
+    client = socketio.Client(reconnection=False)
+    try:
+        client.connect(url, transports=['websocket'], wait_timeout=CONNECT_TIMEOUT)
+        return client
+    except Exception:
+        return None
+
+
+def measure_calls(client, calls):
+    """Latências (ms) de `calls` eventos com ack numa conexão"""
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        client.call('join_socketio_room', {}, timeout=CONNECT_TIMEOUT)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run(runner, connections, calls, port):
+    env = dict(os.environ, PORT=str(port))
+    server = subprocess.Popen(RUNNERS[runner], env=env, cwd=APP_DIR,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        url = f'http://127.0.0.1:{port}'
+
+        # Uma conexão de aquecimento antes de medir a memória base
+        warmup = open_connection(url)
+        measure_calls(warmup, 1)
+        rss_before = process_tree_rss(server.pid)
+
+        with ThreadPoolExecutor(max_workers=64) as pool:
+            clients = [c for c in pool.map(open_connection, [url] * connections) if c]
+        rss_after = process_tree_rss(server.pid)
+
+        latencies = []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=64) as pool:
+            for result in pool.map(lambda c: measure_calls(c, calls), clients):
+                latencies.extend(result)
+        elapsed = time.perf_counter() - started
+
+        warmup.disconnect()
+
+        for client in clients:
+            client.disconnect()
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        'runner': runner,
+        'connected': len(clients),
+        'p50': statistics.median(latencies) if latencies else 0.0,
+        'p99': percentile(latencies, 99),
+        'events_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+        'kb_per_connection': (rss_after - rss_before) / 1024 / len(clients) if clients else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Capacidade, latência e memória: dev x gunicorn x asgi')
+    parser.add_argument('--runners', nargs='+', choices=sorted(RUNNERS), default=['dev', 'gunicorn', 'asgi'])
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--port', type=int, default=int(os.environ.get('BENCH_PORT', '5301')))
+    args = parser.parse_args()
+
+    results = [run(r, args.connections, args.calls, args.port) for r in args.runners]
+
+    print()
+    print(f'{"runner":>10} {"conectados":>11} {"p50 (ms)":>9} {"p99 (ms)":>9} {"eventos/s":>10} {"KB/conexão":>11}')
+    for r in results:
+        print(f'{r["runner"]:>10} {r["connected"]:>5}/{args.connections:<5} {r["p50"]:>9.2f} {r["p99"]:>9.2f} '
+              f'{r["events_per_sec"]:>10.1f} {r["kb_per_connection"]:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Agrupamento das mensagens enviadas para uma sala
+
+Uma rajada de entradas na sala (30 jogadores chegando juntos) gerava uma
+mensagem por entrada para todos os clientes, e o anfitrião clicando na
+validação gerava uma mensagem por clique. As mensagens de COALESCED_EVENTS
+para uma sala esperam até BROADCAST_WINDOW segundos e saem juntas num único
+frame (`room_batch`, lista de [evento, dados]):
+
+- roster_delta: os deltas da lista de jogadores viram um só, da primeira
+  versão base à última versão (ver merge_roster_deltas);
+- answer_validation_changed: só o último estado de cada resposta.
+
+Qualquer outra mensagem para a sala envia antes o que está esperando, então a
+ordem das mensagens não muda. As mensagens agrupadas vão para a sala inteira
+(o include_self=False é ignorado: o cliente descarta o que já tem).
+BROADCAST_WINDOW=0 desliga o agrupamento.
+"""
+import os
+import threading
+import time
+
+BROADCAST_WINDOW = float(os.environ.get('BROADCAST_WINDOW', '0.05'))
+
+BATCH_EVENT = 'room_batch'
+
+
+def merge_roster_deltas(older, newer):
+    """Junta dois roster_delta seguidos, deixando uma operação por jogador: quem
+    entrou e saiu na mesma janela some, e a entrada seguida de atualização vira
+    uma entrada com os dados novos"""
+    changes = {}
+    for op, item in older['changes'] + newer['changes']:
+        player_id = item if op == 'remove' else item['id']
+        previous = changes.get(player_id)
+        if previous and previous[0] == 'add':
+            if op == 'remove':
+                del changes[player_id]
+                continue
+            op = 'add'
+        changes[player_id] = [op, item]
+    return {'base': older['base'], 'version': newer['version'], 'changes': list(changes.values())}
+
+
+def _roster_key(event, data):
+    return 'roster'
+
+
+def _validation_key(event, data):
+    return ('validation', data['player_id'], data['category_index'])
+
+
+# {evento: chave}: uma mensagem nova tira da fila a anterior com a mesma chave
+# (ou se junta a ela, se o evento estiver em MERGERS)
+COALESCED_EVENTS = {
+    'roster_delta': _roster_key,
+    'answer_validation_changed': _validation_key,
+}
+
+MERGERS = {
+    'roster_delta': merge_roster_deltas,
+}
+
+# Totais desde o início do processo (ver /debug/broadcasts)
+broadcast_stats = {
+    'events': 0,        # mensagens agrupáveis recebidas dos handlers
+    'merged': 0,        # substituídas ou juntadas a uma mais recente com a mesma chave
+    'frames': 0,        # frames enviados (mensagem avulsa ou room_batch)
+    'frames_saved': 0,  # events - frames
+}
+
+
+class BroadcastCoalescer:
+    def __init__(self, window):
+        self.window = window
+        self._pending = {}   # {sala: [(chave, evento, dados)]}
+        self._deadline = {}  # {sala: instante (monotonic) do envio}
+        self._lock = threading.RLock()
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    def add(self, room, event, data):
+        key = COALESCED_EVENTS[event](event, data)
+        merge = MERGERS.get(event)
+        with self._lock:
+            frames = self._pending.get(room)
+            if frames is None:
+                frames = self._pending[room] = []
+                self._deadline[room] = time.monotonic() + self.window
+            kept = []
+            for frame in frames:
+                if frame[0] != key:
+                    kept.append(frame)
+                elif merge:
+                    data = merge(frame[2], data)
+            broadcast_stats['events'] += 1
+            broadcast_stats['merged'] += len(frames) - len(kept)
+            kept.append((key, event, data))
+            self._pending[room] = kept
+
+    def take(self, room):
+        """Retira as mensagens que esperam na sala (antes de outra mensagem para ela)"""
+        with self._lock:
+            self._deadline.pop(room, None)
+            return self._pending.pop(room, None)
+
+    def take_due(self):
+        """Retira as salas cuja janela já terminou: {sala: mensagens}"""
+        now = time.monotonic()
+        with self._lock:
+            due = [room for room, deadline in self._deadline.items() if deadline <= now]
+            return {room: self.take(room) for room in due}
+
+    def send(self, transport, room, frames):
+        """Envia as mensagens da sala por `transport` num único frame"""
+        broadcast_stats['frames'] += 1
+        broadcast_stats['frames_saved'] = broadcast_stats['events'] - broadcast_stats['frames']
+        if len(frames) == 1:
+            _, event, data = frames[0]
+            transport.emit(event, data, room=room)
+        else:
+            transport.emit(BATCH_EVENT, [[event, data] for _, event, data in frames], room=room)
+
+    def flush_due(self, transport):
+        """Envia as salas com a janela vencida (loop do servidor). Retorna quantas."""
+        due = self.take_due()
+        for room, frames in due.items():
+            self.send(transport, room, frames)
+        return len(due)
+
+
+coalescer = BroadcastCoalescer(BROADCAST_WINDOW)
@@ -0,0 +1,120 @@
+"""
+Confere que o join_room faz O(1) consultas, qualquer que seja o tamanho da
+tabela de salas
+
+Para cada tamanho em `--rooms`, completa a tabela com salas de teste (anfitrião
+'check-queries-<n>') e entra em uma delas duas vezes pelo cliente de teste do
+Flask-SocketIO, como um servidor de um worker só:
+
+- fria: a sala não está na memória e é carregada do banco;
+- quente: a mesma sala, já na memória.
+
+As consultas e as linhas lidas de cada entrada vêm de event_query_stats['join_room']
+(as mesmas de /debug/queries): uma única consulta que lesse a tabela inteira
+aparece nas linhas. Termina com erro se algum número mudar de um tamanho para
+outro.
+As salas de teste são apagadas no fim. Uso:
+    python check_queries.py --rooms 100 10000
+"""
+import argparse
+import hashlib
+import os
+import sys
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+# Todas as salas de teste pertencem a este processo (sharding.py)
+os.environ['WORKER_COUNT'] = '1'
+os.environ['WORKER_INDEX'] = '0'
+
+import app as server
+from database import engine
+from game_events import event_query_stats, room_store
+from sqlalchemy import text
+
+HOST_PREFIX = 'check-queries-'
+
+# Sala de teste n: código hexadecimal derivado de n (ver seeded_room_id), um anfitrião.
+# Um código que já exista no banco é pulado (ON CONFLICT), nunca sobrescrito.
+SEED_ROOMS = f"""
+    INSERT INTO rooms (room_id, host_id, game_state, current_round, categories, used_letters, current_match)
+    SELECT upper(left(md5('{HOST_PREFIX}' || n), 8)), '{HOST_PREFIX}' || n, 'waiting', 0, :categories, '', 1
+    FROM generate_series(:start, :stop) n
+    ON CONFLICT DO NOTHING
+"""
+SEED_PLAYERS = f"""
+    INSERT INTO players (player_id, room_id, name, score, is_host)
+    SELECT host_id, room_id, 'Anfitrião', 0, true
+    FROM rooms WHERE host_id LIKE '{HOST_PREFIX}%'
+    ON CONFLICT DO NOTHING
+"""
+CLEANUP = f"DELETE FROM rooms WHERE host_id LIKE '{HOST_PREFIX}%'"
+
+
+def seeded_room_id(n):
+    return hashlib.md5(f'{HOST_PREFIX}{n}'.encode()).hexdigest()[:8].upper()
+
+
+def seed(seeded, size):
+    """Completa a tabela até `size` salas de teste"""
+    if size <= seeded:
+        return seeded
+    params = {'start': seeded + 1, 'stop': size, 'categories': 'Nome,Animal,Cidade'}
+    with engine.begin() as conn:
+        conn.execute(text(SEED_ROOMS), params)
+        conn.execute(text(SEED_PLAYERS), params)
+    return size
+
+
+def join_queries(room_id):
+    """(consultas, linhas lidas) de uma entrada na sala"""
+    client = server.socketio.test_client(server.app)
+    before = dict(event_query_stats.get('join_room', {'queries': 0, 'rows': 0}))
+    client.emit('join_room', {'room_id': room_id, 'player_name': 'Verificação'})
+    errors = [m['args'][0] for m in client.get_received() if m['name'] == 'error']
+    client.disconnect()
+    if errors:
+        raise RuntimeError(f'join_room falhou na sala {room_id}: {errors[0]}')
+    after = event_query_stats['join_room']
+    return after['queries'] - before['queries'], after['rows'] - before['rows']
+
+
+def check(sizes):
+    """{tamanho: ((consultas, linhas) fria, (consultas, linhas) quente)}"""
+    results = {}
+    seeded = 0
+    for size in sorted(sizes):
+        seeded = seed(seeded, size)
+        # Sempre a última sala criada: nenhuma entrada anterior a carregou
+        room_id = seeded_room_id(size)
+        cold = join_queries(room_id)
+        warm = join_queries(room_id)
+        results[size] = (cold, warm)
+        print(f'{size:>8} salas: fria {cold[0]} consultas / {cold[1]} linhas, '
+              f'quente {warm[0]} consultas / {warm[1]} linhas')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rooms', type=int, nargs='+', default=[100, 10000],
+                        help='tamanhos da tabela de salas')
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        conn.execute(text(CLEANUP))
+    try:
+        results = check(args.rooms)
+        # Grava as entradas de teste antes de apagar as salas
+        room_store.flush()
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(CLEANUP))
+
+    if len(set(results.values())) > 1:
+        print('❌ join_room faz mais consultas (ou lê mais linhas) em tabelas maiores')
+        sys.exit(1)
+    print('✓ join_room faz O(1) consultas')
+
+
+if __name__ == '__main__':
+    main()
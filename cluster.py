@@ -0,0 +1,126 @@
+"""
+Modo com vários workers
+
+Sobe WORKER_COUNT processos do app (gunicorn), cada um na sua porta (BASE_PORT + índice),
+todos ligados à mesma fila de mensagens do Socket.IO (SOCKETIO_MESSAGE_QUEUE).
+Cada sala vive na memória de um único worker (ver sharding.py); o proxy na frente
+encaminha as conexões pelo parâmetro `room` da URL.
+
+Uso:
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 python cluster.py --workers 4
+    python cluster.py --workers 4 --nginx > adedonha.conf   # configuração do proxy
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+from sharding import HEX_DIGITS, worker_for_digit
+
+NGINX_TEMPLATE = """# Gerado por: python cluster.py --workers {workers} --base-port {base_port} --nginx
+map $arg_room $adedonha_worker {{
+    default adedonha_any;
+{routes}
+}}
+
+upstream adedonha_any {{
+    # Conexões sem sala (página inicial): fixar o cliente para o polling do Socket.IO
+    hash $remote_addr consistent;
+{servers}
+}}
+
+map $http_upgrade $connection_upgrade {{
+    default upgrade;
+    ''      close;
+}}
+
+server {{
+    listen {listen};
+
+    location / {{
+        proxy_pass http://$adedonha_worker;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection $connection_upgrade;
+        proxy_set_header Host $host;
+        proxy_read_timeout 120s;
+    }}
+}}
+"""
+
+
+def worker_port(base_port, index):
+    return base_port + index
+
+
+def nginx_config(workers, base_port, listen):
+    routes = '\n'.join(
+        f'    ~*^{digit} 127.0.0.1:{worker_port(base_port, worker_for_digit(digit, workers))};'
+        for digit in HEX_DIGITS
+    )
+    servers = '\n'.join(
+        f'    server 127.0.0.1:{worker_port(base_port, i)};' for i in range(workers)
+    )
+    return NGINX_TEMPLATE.format(workers=workers, base_port=base_port, listen=listen,
+                                 routes=routes, servers=servers)
+
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cada worker é um gunicorn com o ponto de entrada de produção (ver gunicorn.conf.py)
+WORKER_COMMAND = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+
+
+def start_workers(workers, base_port, command=None):
+    """Inicia os workers e retorna a lista de processos"""
+    command = command or WORKER_COMMAND
+    processes = []
+    for index in range(workers):
+        env = dict(os.environ,
+                   PORT=str(worker_port(base_port, index)),
+                   WORKER_INDEX=str(index),
+                   WORKER_COUNT=str(workers))
+        processes.append(subprocess.Popen(command, env=env, cwd=APP_DIR))
+        print(f'🚀 Worker {index} na porta {worker_port(base_port, index)}')
+    return processes
+
+
+def stop_workers(processes):
+    for process in processes:
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+    for process in processes:
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sobe vários workers do Adedonha')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WORKER_COUNT', '2')))
+    parser.add_argument('--base-port', type=int, default=int(os.environ.get('BASE_PORT', '5001')))
+    parser.add_argument('--listen', type=int, default=int(os.environ.get('PORT', '5000')),
+                        help='porta pública do proxy (apenas para --nginx)')
+    parser.add_argument('--nginx', action='store_true', help='imprime a configuração do nginx e sai')
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.workers > len(HEX_DIGITS):
+        sys.exit(f'❌ Use entre 1 e {len(HEX_DIGITS)} workers')
+
+    if args.nginx:
+        print(nginx_config(args.workers, args.base_port, args.listen))
+        return
+
+    if args.workers > 1 and not os.environ.get('SOCKETIO_MESSAGE_QUEUE'):
+        sys.exit('❌ Defina SOCKETIO_MESSAGE_QUEUE (ex.: redis://localhost:6379/0) para usar vários workers')
+
+    processes = start_workers(args.workers, args.base_port)
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_workers(processes)
+
+
+if __name__ == '__main__':
+    main()
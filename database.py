@@ -1,8 +1,19 @@
-from sqlalchemy import create_engine, Column, String, Integer, Float, Boolean, Text
+from sqlalchemy import create_engine, event, exc, func, text, Column, String, Integer, BigInteger, Float, Boolean, Text, Date, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.engine import make_url
+from greenlet import getcurrent
 import os
+import time
+from datetime import datetime, timedelta, timezone
+from contextlib import contextmanager
+from contextvars import ContextVar
 from urllib.parse import quote_plus
+from log import get_logger
+
+log = get_logger('database')
 
 # Usar variável de ambiente para DATABASE_URL
 DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -17,16 +28,138 @@ if not DATABASE_URL:
     password_encoded = quote_plus(DB_PASSWORD)
     DATABASE_URL = f'postgresql://{DB_USER}:{password_encoded}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
 
-print(f'Conectando ao banco: {DATABASE_URL.split("@")[1] if "@" in DATABASE_URL else "local"}')
+log.info('Conectando ao banco', target=DATABASE_URL.split("@")[1] if "@" in DATABASE_URL else "local")
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mede quanto tempo os greenlets esperam por uma conexão"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiters = 0        # greenlets esperando uma conexão agora
+        self.checkouts = 0      # conexões entregues
+        self.timeouts = 0       # esperas que estouraram o pool_timeout
+        self.wait_total = 0.0   # segundos somados de espera
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        self.waiters += 1
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiters -= 1
+            waited = time.perf_counter() - started
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        self.checkouts += 1
+        return conn
+
+    def stats(self):
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            'overflow': self.overflow(),
+            'idle': self.checkedin(),
+            'waiters': self.waiters,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_time_total': round(self.wait_total, 6),
+            'wait_time_max': round(self.wait_max, 6),
+            'wait_time_avg': round(self.wait_total / self.checkouts, 6) if self.checkouts else 0.0,
+        }
+
+class InstrumentedAsyncPool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """Mesmas métricas para o engine assíncrono (asyncpg)"""
+
+# Pool configurável por variáveis de ambiente
+POOL_OPTIONS = dict(
+    pool_size=int(os.environ.get('DB_POOL_SIZE', '10')),
+    max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', '20')),
+    pool_timeout=float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    # Reciclar conexões antigas antes que o servidor/proxy as derrube
+    pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+    # Testar a conexão antes de usar (descarta conexões mortas após queda do banco)
+    pool_pre_ping=os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+)
 
 # Criar engine
-engine = create_engine(DATABASE_URL, echo=False, client_encoding='utf8')
+engine = create_engine(
+    DATABASE_URL,
+    echo=False,
+    client_encoding='utf8',
+    poolclass=InstrumentedQueuePool,
+    **POOL_OPTIONS
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Uma sessão por greenlet: handlers concorrentes nunca compartilham a mesma sessão
+ScopedSession = scoped_session(SessionLocal, scopefunc=getcurrent)
 Base = declarative_base()
 
+def pool_stats(db_engine=None):
+    """Métricas do pool de conexões (para monitoramento)"""
+    return (db_engine or engine).pool.stats()
+
+# Contador de consultas do greenlet atual (cada greenlet tem seu próprio contexto)
+_query_counter = ContextVar('query_counter', default=None)
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0  # linhas devolvidas pelos SELECTs (rowcount do driver)
+
+# Todas as consultas do processo, inclusive as da gravação em lote e da carga de
+# sala, que rodam fora dos handlers (ver /metrics e o bench_rounds.py)
+query_totals = {'queries': 0, 'seconds': 0.0}
+
+@event.listens_for(engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    query_totals['queries'] += 1
+    context._query_started = time.perf_counter()
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+@event.listens_for(engine, 'after_cursor_execute')
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    query_totals['seconds'] += elapsed
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.seconds += elapsed
+        counter.rows += max(cursor.rowcount, 0) if cursor.description is not None else 0
+
+def create_async_db_engine():
+    """Engine assíncrono (asyncpg) com o mesmo banco e o mesmo pool, para o asgi_app.py"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    url = make_url(DATABASE_URL).set(drivername='postgresql+asyncpg')
+    async_engine = create_async_engine(url, echo=False, poolclass=InstrumentedAsyncPool, **POOL_OPTIONS)
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', _count_query)
+    event.listen(async_engine.sync_engine, 'after_cursor_execute', _time_query)
+    return async_engine
+
+@contextmanager
+def count_queries():
+    """Conta as consultas executadas dentro do bloco"""
+    counter = QueryCounter()
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
 # Modelos
 class Room(Base):
     __tablename__ = 'rooms'
+    __table_args__ = (
+        Index('ix_rooms_last_activity', 'last_activity'),
+    )
     
     room_id = Column(String(8), primary_key=True)
     host_id = Column(String(50), nullable=False)
@@ -35,39 +168,143 @@ class Room(Base):
     current_letter = Column(String(1), nullable=True)
     categories = Column(Text, nullable=False)
     used_letters = Column(Text, default='')  # Letras já usadas nesta sala
+    last_activity = Column(DateTime(timezone=True), nullable=False, server_default=func.now())  # Última gravação da sala
+    created_on = Column(Date, nullable=False, server_default=func.current_date())  # Partição das respostas da sala
+    current_match = Column(Integer, nullable=False, default=1)  # Partida atual (nova partida incrementa)
+
+    # Jogadores e respostas são apagados pelo banco (ON DELETE CASCADE)
+    players = relationship('Player', back_populates='room', passive_deletes=True)
 
 class Player(Base):
     __tablename__ = 'players'
+    __table_args__ = (
+        Index('ix_players_room_id', 'room_id'),
+    )
     
     player_id = Column(String(50), primary_key=True)
-    room_id = Column(String(8), nullable=False)
+    room_id = Column(String(8), ForeignKey('rooms.room_id', ondelete='CASCADE'), nullable=False)
     name = Column(String(50), nullable=False)
     score = Column(Float, default=0.0)
     is_host = Column(Boolean, default=False)
 
+    room = relationship('Room', back_populates='players')
+
 class Answer(Base):
+    """Respostas, particionadas por dia (created_on = dia de criação da sala, então
+    todas as respostas de uma sala ficam na mesma partição). Nada é apagado linha
+    a linha: partidas e salas encerradas vão para o histórico e as partições
+    antigas são descartadas inteiras (ver drop_expired_answer_partitions)."""
     __tablename__ = 'answers'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    room_id = Column(String(8), nullable=False)
-    player_id = Column(String(50), nullable=False)
-    round = Column(Integer, nullable=False)
-    category = Column(String(50), nullable=False)
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_on)'}
+
+    # Chave natural, usada pelo upsert (INSERT ... ON CONFLICT); inclui a chave de partição
+    room_id = Column(String(8), primary_key=True)
+    match_number = Column(Integer, primary_key=True, default=1)
+    round = Column(Integer, primary_key=True)
+    player_id = Column(String(50), primary_key=True)
+    category = Column(String(50), primary_key=True)
+    created_on = Column(Date, primary_key=True)
     answer = Column(String(100), nullable=True)
+    answer_key = Column(Text, nullable=True)  # validation.normalize_answer(answer), calculada no envio
     points = Column(Float, default=0.0)
     invalidated = Column(Boolean, default=False)
     validation_state = Column(String(10), default='valid')  # 'valid', 'half', 'invalid'
 
-# Criar tabelas
+class MatchHistory(Base):
+    """Histórico das partidas encerradas: uma linha por rodada, só INSERT.
+    `answers`: {player_id: {name, points, answers: {categoria: [resposta, pontos, estado, invalidada]}}}.
+    As rodadas de uma partida têm o mesmo room_id e o mesmo archived_at."""
+    __tablename__ = 'match_history'
+    __table_args__ = (
+        Index('ix_match_history_room_id', 'room_id'),
+        Index('ix_match_history_archived_at', 'archived_at'),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    room_id = Column(String(8), nullable=False)
+    round = Column(Integer, nullable=False)
+    letter = Column(String(1), nullable=True)
+    answers = Column(JSONB, nullable=False)
+    archived_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+# ==================== PARTIÇÕES DAS RESPOSTAS ====================
+
+# Partições criadas com antecedência (dias) e dias mantidos depois do dia da partição
+ANSWER_PARTITIONS_AHEAD = int(os.environ.get('ANSWER_PARTITIONS_AHEAD', '3'))
+ANSWER_RETENTION_DAYS = max(int(os.environ.get('ANSWER_RETENTION_DAYS', '3')), 2)
+
+# Chave do advisory lock da manutenção das partições (vários workers)
+PARTITION_LOCK_KEY = 48151624
+
+def today_utc():
+    """Dia usado em created_on (salas e partições sempre em UTC)"""
+    return datetime.now(timezone.utc).date()
+
+def answer_partition_name(day):
+    return f'answers_{day:%Y%m%d}'
+
+def answer_partitions(conn):
+    """{dia: nome} das partições existentes da tabela answers"""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'answers'::regclass"
+    )).scalars()
+    return {datetime.strptime(name[len('answers_'):], '%Y%m%d').date(): name for name in rows}
+
+def create_answer_partitions(conn):
+    """Garante as partições de ontem até ANSWER_PARTITIONS_AHEAD dias à frente"""
+    existing = answer_partitions(conn)
+    created = []
+    today = today_utc()
+    for offset in range(-1, ANSWER_PARTITIONS_AHEAD + 1):
+        day = today + timedelta(days=offset)
+        if day in existing:
+            continue
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {answer_partition_name(day)} PARTITION OF answers "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        ))
+        created.append(answer_partition_name(day))
+    return created
+
+def drop_expired_answer_partitions(conn):
+    """Descarta (DROP TABLE, sem DELETE nem VACUUM) as partições mais velhas que
+    ANSWER_RETENTION_DAYS que nenhuma sala existente ainda usa"""
+    cutoff = today_utc() - timedelta(days=ANSWER_RETENTION_DAYS)
+    dropped = []
+    for day, name in sorted(answer_partitions(conn).items()):
+        if day >= cutoff:
+            continue
+        in_use = conn.execute(text('SELECT 1 FROM rooms WHERE created_on = :day LIMIT 1'), {'day': day}).first()
+        if in_use:
+            continue
+        conn.execute(text(f'DROP TABLE {name}'))
+        dropped.append(name)
+    return dropped
+
+def manage_answer_partitions(conn):
+    """Cria as próximas partições e descarta as expiradas (init_db e reaper).
+    Retorna (criadas, descartadas)."""
+    conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': PARTITION_LOCK_KEY})
+    return create_answer_partitions(conn), drop_expired_answer_partitions(conn)
+
+# Criar tabelas / aplicar migrações pendentes
 def init_db():
-    Base.metadata.create_all(bind=engine)
-    print('✓ Banco de dados inicializado')
+    from migrations import upgrade
+    version = upgrade(engine)
+    with engine.begin() as conn:
+        created, dropped = manage_answer_partitions(conn)
+    log.info('✓ Banco de dados inicializado', schema_version=version,
+             partitions_created=len(created), partitions_dropped=len(dropped))
 
-# Função para obter sessão
+# Função para obter sessão (a do greenlet atual)
 def get_db():
-    db = SessionLocal()
+    return ScopedSession()
+
+@contextmanager
+def db_session():
+    """Sessão do greenlet atual, devolvida ao pool e removida do registro no fim do bloco"""
     try:
-        return db
-    except Exception as e:
-        db.close()
-        raise e
+        yield ScopedSession()
+    finally:
+        ScopedSession.remove()
@@ -0,0 +1,227 @@
+"""
+Dicionários das categorias para a validação automática do stop_game
+
+Com DICTIONARY_DIR definido, cada categoria pode ter uma lista de palavras em
+`<DICTIONARY_DIR>/<categoria>.txt` (uma por linha, UTF-8; o nome do arquivo é a
+categoria normalizada, com '_' no lugar dos espaços: nome.txt, animal.txt,
+cidade.txt...). Categorias sem arquivo não são verificadas.
+
+A lista é compilada num índice (`<categoria>.idx`, refeito quando o .txt muda)
+com as chaves normalizadas (validation.normalize_answer) ordenadas e separadas
+por letra inicial; o índice é aberto com mmap na primeira consulta da categoria,
+então nada é lido na subida do servidor e os processos compartilham as páginas.
+Cada consulta é uma busca binária dentro da letra.
+
+Veredito de uma resposta (classify):
+- 'valid': está na lista;
+- 'invalid': nenhuma palavra da lista começa com os PREFIX_LENGTH primeiros
+  caracteres da resposta (provavelmente inventada);
+- 'unknown': não está na lista, mas há palavras com o mesmo começo.
+
+Os três vão para o anfitrião no game_stopped (auto_verified e auto_suspect); as
+listas nunca são completas, então nada é invalidado, a não ser com
+DICTIONARY_INVALIDATE=true, que invalida as 'invalid' (o anfitrião pode reverter).
+
+Para compilar os índices antes do deploy: python dictionary.py --build
+"""
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+
+from validation import normalize_answer
+from log import get_logger
+
+log = get_logger('dictionary')
+
+DICTIONARY_DIR = os.environ.get('DICTIONARY_DIR', '')
+# Invalidar no stop as respostas 'invalid' em vez de só marcá-las como suspeitas
+DICTIONARY_INVALIDATE = os.environ.get('DICTIONARY_INVALIDATE', 'false').lower() == 'true'
+
+# Começo da resposta que precisa existir na lista para ela não ser marcada como inválida
+PREFIX_LENGTH = 3
+
+# Formato do índice: cabeçalho (MAGIC, quantidade de palavras), tabela de letras
+# (início e fim de cada letra, 'a'..'z' e depois as demais), deslocamentos das
+# palavras (quantidade + 1) e as palavras em UTF-8, em ordem, sem separador
+MAGIC = b'ADXI0001'
+HEADER = struct.Struct('<8sI')
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+OTHER = len(LETTERS)
+LETTER_TABLE = struct.Struct(f'<{2 * (len(LETTERS) + 1)}I')
+
+# Totais desde o início do processo (ver /metrics)
+dictionary_stats = {
+    'indexes_loaded': 0,
+    'lookups': 0,
+    'valid': 0,
+    'unknown': 0,
+    'invalid': 0,
+}
+
+
+def letter_slot(key):
+    index = LETTERS.find(key[:1]) if key else -1
+    return index if index >= 0 else OTHER
+
+
+def category_file(category, extension):
+    return os.path.join(DICTIONARY_DIR, normalize_answer(category).replace(' ', '_') + extension)
+
+
+def compile_index(source, target):
+    """Compila a lista de palavras `source` no índice `target`. Retorna quantas palavras."""
+    with open(source, encoding='utf-8') as f:
+        keys = sorted({normalize_answer(line) for line in f} - {''},
+                      key=lambda key: (letter_slot(key), key))
+
+    encoded = [key.encode('utf-8') for key in keys]
+    offsets = [0]
+    for word in encoded:
+        offsets.append(offsets[-1] + len(word))
+
+    table = [0] * (2 * (len(LETTERS) + 1))
+    for slot in range(len(LETTERS) + 1):
+        table[2 * slot] = bisect_left(keys, slot, key=letter_slot)
+        table[2 * slot + 1] = bisect_left(keys, slot + 1, key=letter_slot)
+
+    # Grava num arquivo temporário e troca: outro processo pode estar lendo o índice antigo
+    partial = f'{target}.{os.getpid()}.tmp'
+    with open(partial, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(keys)))
+        f.write(LETTER_TABLE.pack(*table))
+        f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        f.write(b''.join(encoded))
+    os.replace(partial, target)
+    return len(keys)
+
+
+class WordIndex:
+    """Índice compilado de uma categoria, lido direto do mmap"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path}: índice em formato desconhecido')
+        self._letters = LETTER_TABLE.unpack_from(self._map, HEADER.size)
+        offsets_start = HEADER.size + LETTER_TABLE.size
+        self._words_start = offsets_start + 4 * (self.count + 1)
+        self._offsets = memoryview(self._map)[offsets_start:self._words_start].cast('I')
+
+    def word(self, position):
+        start = self._words_start + self._offsets[position]
+        end = self._words_start + self._offsets[position + 1]
+        return self._map[start:end].decode('utf-8')
+
+    def _lower_bound(self, key):
+        """Primeira posição, dentro da letra de `key`, com palavra >= key; e o fim da letra"""
+        slot = letter_slot(key)
+        low, high = self._letters[2 * slot], self._letters[2 * slot + 1]
+        end = high
+        while low < high:
+            middle = (low + high) // 2
+            if self.word(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low, end
+
+    def contains(self, key):
+        position, end = self._lower_bound(key)
+        return position < end and self.word(position) == key
+
+    def has_prefix(self, prefix):
+        position, end = self._lower_bound(prefix)
+        return position < end and self.word(position).startswith(prefix)
+
+
+_indexes = {}  # {arquivo da categoria: WordIndex ou None (sem lista)}
+_lock = threading.Lock()
+
+
+def enabled():
+    return bool(DICTIONARY_DIR)
+
+
+def index_for(category):
+    """Índice da categoria, compilado e aberto na primeira consulta (None se não houver lista)"""
+    source = category_file(category, '.txt')
+    if source in _indexes:
+        return _indexes[source]
+    with _lock:
+        if source not in _indexes:
+            _indexes[source] = _load(source, category_file(category, '.idx'))
+        return _indexes[source]
+
+
+def _load(source, target):
+    if not os.path.exists(source):
+        return None
+    try:
+        if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source):
+            started = time.perf_counter()
+            words = compile_index(source, target)
+            log.info('📖 Dicionário compilado', source=source, words=words,
+                     ms=round((time.perf_counter() - started) * 1000, 1))
+        index = WordIndex(target)
+    except Exception:
+        log.exception('Erro ao carregar dicionário', source=source)
+        return None
+    dictionary_stats['indexes_loaded'] += 1
+    return index
+
+
+def classify(category, key):
+    """'valid', 'unknown' ou 'invalid' para a chave normalizada da resposta; None se
+    a categoria não tiver dicionário"""
+    if not enabled() or not key:
+        return None
+    index = index_for(category)
+    if index is None:
+        return None
+    if index.contains(key):
+        verdict = 'valid'
+    elif index.has_prefix(key[:PREFIX_LENGTH]):
+        verdict = 'unknown'
+    else:
+        verdict = 'invalid'
+    dictionary_stats['lookups'] += 1
+    dictionary_stats[verdict] += 1
+    return verdict
+
+
+def build_all():
+    """Compila os índices de todas as listas de DICTIONARY_DIR"""
+    for name in sorted(os.listdir(DICTIONARY_DIR)):
+        if not name.endswith('.txt'):
+            continue
+        source = os.path.join(DICTIONARY_DIR, name)
+        started = time.perf_counter()
+        words = compile_index(source, source[:-len('.txt')] + '.idx')
+        print(f'{name}: {words} palavras em {(time.perf_counter() - started) * 1000:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dicionários das categorias')
+    parser.add_argument('--build', action='store_true', help='compila os índices de DICTIONARY_DIR')
+    parser.add_argument('--lookup', nargs=2, metavar=('CATEGORIA', 'RESPOSTA'))
+    args = parser.parse_args()
+
+    if not enabled():
+        parser.error('defina DICTIONARY_DIR')
+    if args.build:
+        build_all()
+    if args.lookup:
+        category, answer = args.lookup
+        started = time.perf_counter()
+        verdict = classify(category, normalize_answer(answer))
+        print(f'{verdict} ({(time.perf_counter() - started) * 1000:.3f} ms, com a carga do índice)')
+
+
+if __name__ == '__main__':
+    main()
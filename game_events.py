@@ -0,0 +1,913 @@
+"""
+Handlers dos eventos do jogo (Socket.IO)
+
+Independentes do servidor: usam `emit`, `join_room` e `request.sid` do
+transport.py. O app.py (eventlet + Flask-SocketIO) e o asgi_app.py (asyncio)
+registram os mesmos handlers de EVENT_HANDLERS, então os nomes e os formatos
+dos eventos são os mesmos nos dois modos.
+"""
+from transport import request, emit, join_room, flush_broadcasts
+from database import count_queries
+from room_state import (RoomStore, RoomState, RoomSnapshot, PlayerState, AnswerState, submission_digest,
+                        new_player_token, player_id_for_token)
+from scoring import score_round
+from validation import RoundValidation
+from payloads import ENCODERS, parse_encoding, encoding_room, room_encodings
+from round_timer import scheduler as round_scheduler, round_timer_stats, round_key, ROUND_COUNTDOWN
+import sharding
+import dictionary
+from log import get_logger, room_debug_enabled
+import metrics
+import random
+import os
+import time
+import inspect
+from functools import wraps
+
+log = get_logger('game')
+
+# Estado das salas em memória (fonte da verdade), gravado no banco em lotes
+room_store = RoomStore()
+
+# Letras disponíveis
+AVAILABLE_LETTERS = list('ABCDEFGHIJLMNOPQRSTUVZ')
+
+# Nome enviado em stopped_by quando a rodada para pelo tempo (round_timer.py)
+TIME_UP = 'Tempo esgotado'
+
+# Alterações de respostas adiantadas guardadas por jogador antes de pedir ressincronização
+MAX_REORDER_BUFFER = int(os.environ.get('MAX_REORDER_BUFFER', '8'))
+
+# Tamanhos máximos, os mesmos das colunas do banco (database.py): um texto maior
+# faria falhar a gravação em lote da sala
+MAX_NAME_LENGTH = 50
+MAX_CATEGORY_LENGTH = 50
+MAX_ANSWER_LENGTH = 100
+
+# Categorias padrão
+DEFAULT_CATEGORIES = ['Nome', 'Animal', 'Cidade', 'Objeto', 'Cor', 'Comida']
+
+
+# Consultas ao banco por evento: {evento: {'events': n, 'queries': total, 'rows': linhas lidas}}
+event_query_stats = {}
+
+# Handlers registrados: {evento: handler}
+EVENT_HANDLERS = {}
+
+
+def on_event(event):
+    """Registra o handler do evento contando as consultas que ele faz no banco
+    e, com METRICS_ENABLED, a latência e o tamanho do payload (metrics.py)"""
+    def decorator(handler):
+        # O servidor pode passar argumentos extras (ex.: auth no connect)
+        num_params = len(inspect.signature(handler).parameters)
+
+        @wraps(handler)
+        def wrapper(*args):
+            args = args[:num_params]
+            started = time.perf_counter()
+            failed = False
+            with count_queries() as counter:
+                try:
+                    return handler(*args)
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    stats = event_query_stats.setdefault(event, {'events': 0, 'queries': 0, 'rows': 0})
+                    stats['events'] += 1
+                    stats['queries'] += counter.count
+                    stats['rows'] += counter.rows
+                    if metrics.METRICS_ENABLED:
+                        metrics.observe_event(event, time.perf_counter() - started, counter.count,
+                                              counter.seconds, args[0] if args else None, failed)
+
+        EVENT_HANDLERS[event] = wrapper
+        return wrapper
+    return decorator
+
+
+@on_event('connect')
+def handle_connect():
+    log.debug('Cliente conectado', sid=request.sid)
+
+
+def emit_encoded(room, event, *args):
+    """Envia um payload grande para a sala, montado uma vez por codificação usada
+    pelos jogadores (ver payloads.py)"""
+    flush_broadcasts(room.room_id)
+    for encoding in room_encodings(room):
+        emit(event, ENCODERS[event][encoding](room, *args), room=encoding_room(room.room_id, encoding))
+
+
+def join_encoding_room(room_id, player, data):
+    """Coloca o socket na sala da codificação que o cliente pediu"""
+    encoding = parse_encoding(data.get('encoding'))
+    if player:
+        player.encoding = encoding
+    join_room(encoding_room(room_id, encoding))
+
+
+def roster_delta(room, changes):
+    """Avança a versão da lista de jogadores e devolve o delta a enviar para a sala.
+    `changes`: [['add', jogador], ['update', jogador], ['remove', player_id]], com
+    o jogador no formato de RoomSnapshot.players. O cliente aplica o delta se
+    `base` for a versão que ele tem; se houver lacuna, pede sync_roster."""
+    base = room.roster_version
+    room.roster_version += 1
+    return {'base': base, 'version': room.roster_version, 'changes': changes}
+
+
+def clean_text(value, max_length):
+    """Texto recebido do cliente, sem espaços nas pontas e cortado no tamanho da coluna"""
+    return str(value).strip()[:max_length] if value else ''
+
+
+def current_player_id():
+    """player_id do jogador ligado ao socket do evento (None se o socket ainda não
+    entrou em nenhuma sala)"""
+    return room_store.player_for_sid(request.sid)
+
+
+@on_event('join_socketio_room')
+def handle_join_socketio_room(data):
+    room_id = data.get('room_id')
+    player_name = data.get('player_name', 'Anônimo')  # Nome do jogador para identificação
+    player_token = data.get('player_token')
+
+    if room_id:
+        try:
+            room = room_store.get(room_id)
+            if room:
+                if player_token:
+                    player = room.players.get(player_id_for_token(player_token))
+                else:
+                    # Clientes sem token (abertos antes da troca): procurar jogador pelo NOME na sala
+                    player = next((p for p in room.players.values() if p.name == player_name), None)
+
+                if player:
+                    # Reconexão (recarregou a página, trocou de rede...): só o mapa de
+                    # sessões muda, o player_id e as respostas continuam os mesmos
+                    old_sid = room_store.bind_session(player.player_id, request.sid)
+                    if old_sid != request.sid:
+                        log.info('🔄 Reconectando jogador', room_id=room_id, player=player.name,
+                                 player_id=player.player_id, old_sid=old_sid, new_sid=request.sid)
+
+                        snapshot = RoomSnapshot(room)
+                        emit('player_reconnected', {
+                            'player': snapshot.player(player.player_id),
+                            'room': snapshot.room
+                        })
+                else:
+                    # Jogador não encontrado, pode ser um novo jogador entrando
+                    log.debug('ℹ️ Novo jogador ou jogador não encontrado', room_id=room_id, player=player_name)
+
+                join_encoding_room(room.room_id, player, data)
+
+            join_room(room_id)
+            log.debug('Cliente entrou na sala Socket.IO', sid=request.sid, room_id=room_id)
+        except Exception:
+            log.exception('Erro ao entrar na sala Socket.IO', room_id=room_id)
+
+
+@on_event('disconnect')
+def handle_disconnect():
+    # NÃO remover o jogador no disconnect imediato: isso deletaria a sala quando o
+    # usuário é redirecionado. Ele só sai se não reconectar dentro da carência (reaper.py)
+    room_store.mark_disconnected(request.sid)
+    log.debug('Cliente desconectado', sid=request.sid)
+
+
+def remove_player_from_room(room, player_id):
+    """Tira o jogador da sala: transfere o host, avisa os outros e apaga a sala vazia"""
+    room_id = room.room_id
+    player = room.players[player_id]
+    player_name = player.name
+    was_host = player.is_host
+
+    # Remover jogador
+    room_store.remove_player(room, player_id)
+
+    if not room.players:
+        # Deletar sala e respostas
+        room_store.delete(room_id)
+        log.info('Sala deletada (sem jogadores)', room_id=room_id)
+        return
+
+    changes = [['remove', player_id]]
+
+    # Transferir host se necessário
+    if was_host:
+        new_host = next(iter(room.players.values()))
+        new_host.is_host = True
+        room.host_id = new_host.player_id
+        room_store.touch_room(room)
+        room_store.touch_player(room, new_host.player_id)
+        changes.append(['update', new_host.to_payload()])
+
+        emit('host_changed', {
+            'new_host_id': new_host.player_id,
+            'new_host_name': new_host.name
+        }, room=room_id)
+
+    # Notificar outros jogadores
+    emit('roster_delta', roster_delta(room, changes), room=room_id)
+    log.debug('Jogador saiu', room_id=room_id, player=player_name)
+
+
+@on_event('leave_room_properly')
+def handle_leave_room_properly(data):
+    """Chamado quando o jogador realmente quer sair da sala"""
+    player_id = current_player_id()
+
+    try:
+        room = room_store.room_for_player(player_id)
+
+        if room:
+            remove_player_from_room(room, player_id)
+
+    except Exception:
+        log.exception('Erro ao sair da sala', player_id=player_id)
+
+
+@on_event('create_room')
+def handle_create_room(data):
+    try:
+        player_name = clean_text(data['player_name'], MAX_NAME_LENGTH)
+        room_id = sharding.new_room_id()
+        player_token = new_player_token()
+        player_id = player_id_for_token(player_token)
+
+        # Criar sala
+        new_room = RoomState(
+            room_id=room_id,
+            host_id=player_id,
+            game_state='waiting',
+            current_round=0,
+            current_letter='',
+            categories=DEFAULT_CATEGORIES
+        )
+
+        # Criar jogador
+        new_room.players[player_id] = PlayerState(
+            player_id=player_id,
+            name=player_name,
+            score=0.0,
+            is_host=True
+        )
+
+        room_store.create(new_room)
+        room_store.bind_session(player_id, request.sid)
+
+        log.info('✓ Sala criada', room_id=room_id, player=player_name, player_id=player_id)
+
+        join_room(room_id)
+        join_encoding_room(room_id, new_room.players[player_id], data)
+
+        snapshot = RoomSnapshot(new_room)
+        emit('room_created', {
+            'room_id': room_id,
+            'player': snapshot.player(player_id),
+            'player_token': player_token,
+            'room': snapshot.room
+        })
+
+    except Exception:
+        log.exception('Erro ao criar sala')
+        emit('error', {'message': 'Erro ao criar sala'})
+
+
+@on_event('join_room')
+def handle_join_room(data):
+    try:
+        room_id = data['room_id'].upper()
+        player_name = clean_text(data['player_name'], MAX_NAME_LENGTH)
+        player_token = new_player_token()
+        player_id = player_id_for_token(player_token)
+
+        log.debug('Tentativa de entrar na sala', room_id=room_id, player=player_name)
+
+        # Verificar se sala existe
+        room = room_store.get(room_id)
+
+        if not room:
+            log.info('❌ Sala não encontrada', room_id=room_id, player=player_name)
+            emit('error', {'message': f'Sala {room_id} não encontrada'})
+            return
+
+        if room.game_state != 'waiting':
+            emit('error', {'message': 'Jogo já em andamento'})
+            return
+
+        # Adicionar jogador
+        room_store.add_player(room, PlayerState(
+            player_id=player_id,
+            name=player_name,
+            score=0.0,
+            is_host=False
+        ))
+        room_store.bind_session(player_id, request.sid)
+        delta = roster_delta(room, [['add', room.players[player_id].to_payload()]])
+
+        join_room(room_id)
+        join_encoding_room(room_id, room.players[player_id], data)
+
+        snapshot = RoomSnapshot(room)
+        emit('room_joined', {
+            'room_id': room_id,
+            'player': snapshot.player(player_id),
+            'player_token': player_token,
+            'room': snapshot.room
+        })
+
+        # O próprio jogador já tem essa versão (room_joined) e ignora o delta
+        emit('roster_delta', delta, room=room_id)
+
+        log.info('✓ Jogador entrou na sala', room_id=room_id, player=player_name)
+
+    except Exception:
+        log.exception('Erro ao entrar na sala')
+        emit('error', {'message': 'Erro ao entrar na sala'})
+
+
+@on_event('update_categories')
+def handle_update_categories(data):
+    try:
+        room_id = data['room_id']
+        categories = [clean_text(category, MAX_CATEGORY_LENGTH) for category in data['categories']]
+        player_id = current_player_id()
+
+        room = room_store.get(room_id)
+
+        if not room:
+            emit('error', {'message': 'Sala não encontrada'})
+            return
+
+        if room.host_id != player_id:
+            emit('error', {'message': 'Apenas o criador pode alterar as categorias'})
+            return
+
+        room.categories = list(categories)
+        room_store.touch_room(room)
+
+        emit('categories_updated', {'categories': categories}, room=room_id, include_self=True)
+        log.info('Categorias atualizadas', room_id=room_id, categories=','.join(categories))
+
+    except Exception:
+        log.exception('Erro ao atualizar categorias')
+        emit('error', {'message': 'Erro ao atualizar categorias'})
+
+
+@on_event('start_round')
+def handle_start_round(data):
+    room_id = data['room_id']
+    player_id = current_player_id()
+
+    room = room_store.get(room_id)
+
+    if not room or room.host_id != player_id:
+        emit('error', {'message': 'Apenas o criador pode iniciar a rodada'})
+        return
+
+    if room.game_state != 'waiting':
+        emit('error', {'message': 'Rodada já em andamento'})
+        return
+
+    # Atualizar estado
+    room.current_round += 1
+    room.reset_round_state()
+
+    # Selecionar letra que ainda não foi usada
+    used_letters_list = room.used_letters
+    available = [l for l in AVAILABLE_LETTERS if l not in used_letters_list]
+
+    # Se todas as letras foram usadas, reiniciar
+    if not available:
+        available = AVAILABLE_LETTERS
+        used_letters_list = []
+        log.info('🔄 Todas as letras foram usadas, reiniciando ciclo', room_id=room_id)
+
+    # Escolher letra aleatória das disponíveis
+    room.current_letter = random.choice(available)
+    used_letters_list.append(room.current_letter)
+    room.used_letters = used_letters_list
+
+    room.game_state = 'playing'  # Ir direto para playing
+    room_store.touch_room(room)
+    # Fim da rodada agendado no servidor (round_timer.py)
+    round_scheduler.schedule(room)
+
+    log.debug('📝 Letra sorteada', room_id=room_id, letter=room.current_letter, used=','.join(room.used_letters))
+
+    categories = list(room.categories)
+
+    # A contagem regressiva é feita no cliente; o tempo da rodada (duration, em
+    # segundos, None sem limite) começa depois dela e é controlado pelo servidor
+    emit('round_starting', {
+        'countdown': ROUND_COUNTDOWN,
+        'duration': round_scheduler.duration if round_scheduler.enabled else None,
+        'letter': room.current_letter,
+        'round': room.current_round,
+        'categories': categories
+    }, room=room_id)
+
+    log.info('Rodada iniciada', room_id=room_id, round=room.current_round, letter=room.current_letter)
+
+
+def apply_answer_texts(room, player_id, texts):
+    """Grava as respostas {categoria: texto} que mudaram (sempre salvar, mesmo
+    vazia, para manter a estrutura)"""
+    changed = []
+    for category, answer_text in texts.items():
+        current = room.answers.get((player_id, category))
+        if current is None or current.answer != answer_text:
+            room.answers[(player_id, category)] = AnswerState(
+                player_id=player_id,
+                category=category,
+                answer=answer_text,
+                points=0.0,
+                invalidated=False
+            )
+            changed.append(category)
+
+    room_store.touch_answers(room, player_id, changed)
+    return changed
+
+
+def apply_buffered_changes(room, player_id):
+    """Aplica, em ordem, as alterações do buffer contíguas ao último seq aplicado"""
+    buffered = room.reorder_buffers.get(player_id)
+    first_seq = last_seq = room.answer_seqs.get(player_id, 0)
+    applied = {}
+    while buffered and last_seq + 1 in buffered:
+        last_seq += 1
+        applied.update(buffered.pop(last_seq))
+    if last_seq == first_seq:
+        return
+    room.answer_seqs[player_id] = last_seq
+
+    # O hash do último envio completo deixou de valer
+    room.submission_digests.pop(player_id, None)
+    apply_answer_texts(room, player_id, applied)
+
+
+@on_event('submit_answers')
+def handle_submit_answers(data):
+    """Envio completo das respostas (clientes antigos e ressincronização)"""
+    try:
+        room_id = data['room_id']
+        answers = data['answers']
+        seq = data.get('seq')
+        player_id = current_player_id()
+
+        room = room_store.get(room_id)
+
+        if not room or room.game_state != 'playing' or player_id not in room.players:
+            return
+
+        # Envio completo substitui todas as alterações até este seq
+        if seq is not None:
+            if seq <= room.answer_seqs.get(player_id, 0):
+                return
+            room.answer_seqs[player_id] = seq
+            buffered = room.reorder_buffers.get(player_id, {})
+            for pending_seq in [s for s in buffered if s <= seq]:
+                del buffered[pending_seq]
+
+        categories = room.categories
+        texts = [clean_text(answer, MAX_ANSWER_LENGTH) for answer in answers[:len(categories)]]
+
+        # O cliente reenvia tudo a cada tecla: ignorar se nada mudou desde o último envio
+        digest = submission_digest(categories, texts)
+        if room.submission_digests.get(player_id) == digest:
+            return
+        room.submission_digests[player_id] = digest
+
+        # Remover respostas de categorias que não vieram neste envio
+        submitted = set(categories[:len(texts)])
+        removed = [cat for (pid, cat) in room.answers if pid == player_id and cat not in submitted]
+        room_store.drop_answers(room, player_id, removed)
+
+        apply_answer_texts(room, player_id, dict(zip(categories, texts)))
+        apply_buffered_changes(room, player_id)
+        log.debug('Respostas recebidas', room_id=room_id, player_id=player_id, sample=True)
+
+    except Exception:
+        log.exception('Erro ao submeter respostas')
+
+
+@on_event('submit_answer_changes')
+def handle_submit_answer_changes(data):
+    """Envio incremental: só as categorias alteradas, {índice: texto}, com um
+    número de sequência por jogador. Alterações atrasadas são descartadas e as
+    adiantadas esperam no buffer até a lacuna ser preenchida."""
+    try:
+        room_id = data['room_id']
+        seq = int(data['seq'])
+        player_id = current_player_id()
+
+        room = room_store.get(room_id)
+
+        if not room or room.game_state != 'playing' or player_id not in room.players:
+            return
+
+        # Alteração de outra rodada (chegou depois do stop ou do início da próxima)
+        if data.get('round') != room.current_round:
+            return
+
+        last_seq = room.answer_seqs.get(player_id, 0)
+        if seq <= last_seq:
+            return
+
+        categories = room.categories
+        changes = {}
+        for index, answer_text in data['changes'].items():
+            index = int(index)
+            if 0 <= index < len(categories):
+                changes[categories[index]] = clean_text(answer_text, MAX_ANSWER_LENGTH)
+
+        buffered = room.reorder_buffers.setdefault(player_id, {})
+        buffered[seq] = changes
+
+        if len(buffered) > MAX_REORDER_BUFFER:
+            # Lacuna não preenchida: pedir ao cliente o envio completo
+            buffered.clear()
+            emit('answers_resync_required', {'round': room.current_round})
+            return
+
+        apply_buffered_changes(room, player_id)
+
+    except Exception:
+        log.exception('Erro ao aplicar alterações de respostas')
+
+
+def stop_round(room, player_name, player_id):
+    """Passa a rodada para a validação: validação automática e game_stopped para a sala"""
+    room_id = room.room_id
+    room.game_state = 'validation'
+    room_store.touch_room(room)
+
+    # Pegar todas as respostas
+    round_answers = list(room.answers.values())
+
+    # Despejo completo apenas para salas com depuração ligada
+    if room_debug_enabled(room_id):
+        for ans in round_answers:
+            log.info('Resposta', room_id=room_id, player_id=ans.player_id,
+                     category=ans.category, answer=ans.answer)
+        for p in room.players.values():
+            log.info('Jogador', room_id=room_id, player_id=p.player_id, name=p.name)
+
+    # Normalizar e agrupar as respostas uma única vez; a validação fica em
+    # cache na sala e é reaproveitada pelo invalidate_answer e calculate_scores
+    room.validation = RoundValidation(round_answers, room.categories, room.current_letter)
+
+    # Marcar validações automáticas
+    auto_invalidated, auto_repeated, auto_verified, auto_similar, auto_suspect = room.validation.auto_validate(
+        round_answers, dictionary.classify if dictionary.enabled() else None, dictionary.DICTIONARY_INVALIDATE)
+
+    # Salvar as validações automáticas
+    for pid in {ans.player_id for ans in round_answers}:
+        room_store.touch_answers(room, pid)
+
+    log.debug('Validação automática', room_id=room_id, answers=len(round_answers),
+              players=len(room.players), auto_invalidated=len(auto_invalidated),
+              auto_repeated=len(auto_repeated), auto_verified=len(auto_verified),
+              auto_similar=len(auto_similar), auto_suspect=len(auto_suspect))
+
+    emit_encoded(room, 'game_stopped', player_name, player_id, auto_invalidated, auto_repeated,
+                 auto_verified, auto_similar, auto_suspect)
+
+
+@on_event('stop_game')
+def handle_stop_game(data):
+    try:
+        room_id = data['room_id']
+        player_id = current_player_id()
+
+        room = room_store.get(room_id)
+
+        if not room or room.game_state != 'playing' or player_id not in room.players:
+            return
+
+        player = room.players.get(player_id)
+        player_name = player.name if player else 'Jogador'
+
+        stop_round(room, player_name, player_id)
+
+        log.info('Jogo parado', room_id=room_id, stopped_by=player_name)
+
+    except Exception:
+        log.exception('Erro ao parar jogo')
+
+
+def auto_stop_rounds():
+    """Para as rodadas cujo tempo acabou (chamado pelo loop do round_timer no
+    servidor, com um transporte ativo). Prazos de rodadas que já pararam, de
+    salas fechadas ou de salas fora da memória são descartados."""
+    stopped = 0
+    for room_id, key in round_scheduler.take_due():
+        room = room_store.rooms.get(room_id)
+        if not room or room.game_state != 'playing' or round_key(room) != key:
+            round_timer_stats['stale'] += 1
+            continue
+        try:
+            stop_round(room, TIME_UP, None)
+        except Exception:
+            log.exception('Erro ao parar rodada pelo tempo', room_id=room_id)
+            continue
+        round_timer_stats['auto_stopped'] += 1
+        stopped += 1
+        log.info('⏰ Tempo esgotado', room_id=room_id, round=room.current_round)
+    return stopped
+
+
+@on_event('invalidate_answer')
+def handle_invalidate_answer(data):
+    try:
+        room_id = data['room_id']
+        target_player_id = data['player_id']
+        category_index = data['category_index']
+        player_id = current_player_id()
+
+        room = room_store.get(room_id)
+
+        if not room or room.game_state != 'validation':
+            return
+
+        if room.host_id != player_id:
+            emit('error', {'message': 'Apenas o criador pode invalidar respostas'})
+            return
+
+        categories = room.categories
+        if category_index >= len(categories):
+            return
+
+        category = categories[category_index]
+
+        # Ciclar entre os 3 estados: valid → half → invalid → valid
+        answer = room.answers.get((target_player_id, category))
+
+        if answer:
+            was_invalidated = answer.invalidated
+
+            # Determinar próximo estado
+            if answer.validation_state == 'valid':
+                answer.validation_state = 'half'
+                answer.invalidated = False
+            elif answer.validation_state == 'half':
+                answer.validation_state = 'invalid'
+                answer.invalidated = True
+            else:  # invalid
+                answer.validation_state = 'valid'
+                answer.invalidated = False
+
+            # Ajustar apenas a contagem do grupo desta resposta
+            if room.validation:
+                room.validation.toggle(answer, was_invalidated)
+
+            room_store.touch_answers(room, target_player_id)
+
+            emit('answer_validation_changed', {
+                'player_id': target_player_id,
+                'category_index': category_index,
+                'validation_state': answer.validation_state,
+                'invalidated': answer.invalidated
+            }, room=room_id)
+
+    except Exception:
+        log.exception('Erro ao invalidar resposta')
+
+
+@on_event('toggle_similar')
+def handle_toggle_similar(data):
+    """O anfitrião aceita (ou desfaz) a sugestão de contar uma resposta parecida
+    como repetida da outra (validation.RoundValidation.toggle_similar)"""
+    try:
+        room_id = data['room_id']
+        target_player_id = data['player_id']
+        category_index = data['category_index']
+        player_id = current_player_id()
+
+        room = room_store.get(room_id)
+
+        if not room or room.game_state != 'validation' or not room.validation:
+            return
+
+        if room.host_id != player_id:
+            emit('error', {'message': 'Apenas o criador pode juntar respostas parecidas'})
+            return
+
+        categories = room.categories
+        if category_index >= len(categories):
+            return
+
+        category = categories[category_index]
+        answer = room.answers.get((target_player_id, category))
+        if not answer or not room.validation.toggle_similar(answer):
+            return
+
+        # As marcas da categoria inteira mudam (as iguais e as do grupo parecido)
+        repeated, similar = room.validation.repeat_marks(category)
+        emit('repeats_updated', {
+            'category_index': category_index,
+            'repeated': [[item['player_id'], item['similarity']] for item in repeated],
+            'similar': [[item['player_id'], item['similarity']] for item in similar]
+        }, room=room_id)
+
+    except Exception:
+        log.exception('Erro ao juntar respostas parecidas')
+
+
+@on_event('calculate_scores')
+def handle_calculate_scores(data):
+    try:
+        room_id = data['room_id']
+        player_id = current_player_id()
+
+        room = room_store.get(room_id)
+
+        if not room or room.host_id != player_id or room.game_state != 'validation':
+            return
+
+        room.game_state = 'scoring'
+        room_store.touch_room(room)
+
+        # Calcular pontos a partir dos grupos já montados no stop_game
+        scores, results = score_round(
+            room.answers.values(), room.categories, room.current_letter, room.players,
+            validation=room.validation
+        )
+
+        for ans, points, _ in results:
+            ans.points = points
+
+        for pid in {ans.player_id for ans, _, _ in results}:
+            room_store.touch_answers(room, pid)
+
+        # Atualizar pontuação total (gravada em um único UPDATE em lote)
+        for pid, points in scores.items():
+            player = room.players.get(pid)
+            if player:
+                player.score += points
+                room_store.touch_player(room, pid)
+            else:
+                log.warning('⚠️ Jogador não encontrado ao atualizar pontuação', room_id=room_id, player_id=pid)
+
+        emit_encoded(room, 'scores_calculated', scores, results)
+
+        log.info('Pontuação calculada', room_id=room_id)
+
+    except Exception:
+        log.exception('Erro ao calcular pontuação')
+
+
+@on_event('next_round')
+def handle_next_round(data):
+    try:
+        room_id = data['room_id']
+        player_id = current_player_id()
+
+        room = room_store.get(room_id)
+
+        if not room or room.host_id != player_id:
+            return
+
+        room.game_state = 'waiting'
+        room.current_letter = None
+        room_store.touch_room(room)
+
+        emit('ready_for_next_round', {}, room=room_id)
+        log.debug('Sala pronta para próxima rodada', room_id=room_id)
+
+    except Exception:
+        log.exception('Erro ao preparar próxima rodada')
+
+
+@on_event('new_match')
+def handle_new_match(data):
+    try:
+        room_id = data['room_id']
+        player_id = current_player_id()
+
+        room = room_store.get(room_id)
+
+        if not room or room.host_id != player_id:
+            return
+
+        # Arquivar a partida no histórico (antes de zerar rodada e letras)
+        room_store.finish_match(room)
+
+        # Zerar pontuação
+        for p in room.players.values():
+            p.score = 0.0
+            room_store.touch_player(room, p.player_id)
+
+        # Resetar estado da sala
+        room.game_state = 'waiting'
+        room.current_match += 1  # as respostas da partida anterior ficam com o número antigo
+        room.current_round = 0
+        room.current_letter = None
+        room.used_letters = []  # Resetar letras usadas
+        room_store.touch_room(room)
+
+        # O cliente zera as pontuações da lista que já tem (nenhum jogador entrou ou saiu)
+        emit('match_reset', {'roster_version': room.roster_version}, room=room_id)
+        log.info('Nova partida iniciada', room_id=room_id)
+
+    except Exception:
+        log.exception('Erro ao iniciar nova partida')
+
+
+@on_event('kick_player')
+def handle_kick_player(data):
+    """Expulsar jogador da sala (apenas anfitrião)"""
+    try:
+        room_id = data['room_id']
+        target_player_id = data['target_player_id']
+        host_id = current_player_id()
+
+        # Verificar se quem está expulsando é o anfitrião
+        room = room_store.get(room_id)
+        if not room or room.host_id != host_id:
+            emit('error', {'message': 'Apenas o anfitrião pode expulsar jogadores'})
+            return
+
+        # Não pode expulsar a si mesmo
+        if target_player_id == host_id:
+            emit('error', {'message': 'Você não pode expulsar a si mesmo'})
+            return
+
+        # Buscar jogador a ser expulso
+        target_player = room.players.get(target_player_id)
+        if not target_player:
+            return
+
+        player_name = target_player.name
+
+        # Socket atual do jogador (antes de remover: a sessão sai junto)
+        target_sid = room_store.sid_for_player(target_player_id)
+
+        # Remover jogador e suas respostas
+        room_store.remove_player(room, target_player_id)
+
+        # Notificar o jogador expulso
+        if target_sid:
+            emit('kicked_from_room', {
+                'message': 'Você foi removido da sala pelo anfitrião'
+            }, room=target_sid)
+
+        # Notificar outros jogadores
+        emit('roster_delta', roster_delta(room, [['remove', target_player_id]]), room=room_id)
+
+        log.info('Jogador expulso', room_id=room_id, player=player_name, player_id=target_player_id)
+
+    except Exception:
+        log.exception('Erro ao expulsar jogador')
+
+
+@on_event('sync_roster')
+def handle_sync_roster(data):
+    """Lista completa de jogadores para o cliente que perdeu algum roster_delta"""
+    room_id = data.get('room_id')
+    room = room_store.get(room_id) if room_id else None
+    if room:
+        emit('roster_snapshot', {
+            'version': room.roster_version,
+            'players': RoomSnapshot(room).players
+        })
+
+
+@on_event('close_room')
+def handle_close_room(data):
+    try:
+        room_id = data['room_id']
+        player_id = current_player_id()
+
+        room = room_store.get(room_id)
+
+        if not room or room.host_id != player_id:
+            return
+
+        emit('room_closed', {}, room=room_id)
+
+        # Deletar sala e dados relacionados
+        room_store.delete(room_id)
+
+        log.info('Sala fechada pelo host', room_id=room_id)
+
+    except Exception:
+        log.exception('Erro ao fechar sala')
+
+
+@on_event('send_chat_message')
+def handle_send_chat_message(data):
+    room_id = data.get('room_id')
+    player_name = data.get('player_name')
+    message = data.get('message')
+
+    if room_id and message:
+        emit('chat_message_broadcast', {
+            'player_name': player_name,
+            'message': message
+        }, room=room_id, include_self=False)
@@ -0,0 +1,32 @@
+"""
+Configuração do gunicorn para produção
+
+Todas as opções podem ser ajustadas por variáveis de ambiente. O estado das
+salas vive na memória do processo, então cada instância do gunicorn deve ter
+um único worker; para usar mais núcleos, veja cluster.py.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Worker assíncrono: cada conexão Socket.IO é uma greenlet
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'eventlet')
+workers = 1
+# Máximo de conexões simultâneas do worker
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', '2000'))
+
+# Conexões WebSocket são longas: o timeout só derruba um worker travado
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+# Tempo para terminar os eventos em andamento depois do SIGTERM
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', '20'))
+keepalive = int(os.environ.get('KEEPALIVE', '5'))
+
+accesslog = os.environ.get('ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+def worker_exit(server, worker):
+    """Depois do SIGTERM (e de encerrar as conexões): gravar o estado pendente"""
+    from app import drain
+    drain()
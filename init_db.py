@@ -4,36 +4,50 @@ Execute este script antes de rodar a aplicação pela primeira vez
 """
 
 from database import init_db, engine
+from migrations import check_query_plans
 from sqlalchemy import text
+from log import get_logger
+import sys
+
+log = get_logger('init_db')
 
 def create_database():
     """Cria o banco de dados se não existir"""
-    print('Inicializando banco de dados...')
+    log.info('Inicializando banco de dados...')
     
     try:
         # Testar conexão
         with engine.connect() as conn:
-            result = conn.execute(text('SELECT 1'))
-            print('✓ Conexão com PostgreSQL estabelecida')
+            conn.execute(text('SELECT 1'))
+            log.info('✓ Conexão com PostgreSQL estabelecida')
         
-        # Criar tabelas
+        # Criar tabelas e aplicar migrações pendentes
         init_db()
-        print('✓ Tabelas criadas com sucesso')
+        log.info('✓ Tabelas criadas com sucesso')
         
     except Exception as e:
-        print(f'❌ Erro ao inicializar banco de dados: {e}')
-        print('\nVerifique se:')
-        print('1. PostgreSQL está instalado e rodando')
-        print('2. As credenciais em DATABASE_URL estão corretas')
-        print('3. O banco de dados "adedonha" foi criado')
-        print('\nPara criar o banco, execute no PostgreSQL:')
-        print('   CREATE DATABASE adedonha;')
+        log.error('❌ Erro ao inicializar banco de dados', error=e)
+        log.error('Verifique se: 1. PostgreSQL está instalado e rodando; '
+                  '2. As credenciais em DATABASE_URL estão corretas; '
+                  '3. O banco de dados "adedonha" foi criado '
+                  '(no PostgreSQL: CREATE DATABASE adedonha;)')
         return False
     
     return True
 
+def check_indexes():
+    """Confere se as consultas quentes usam os índices (regressão de plano)"""
+    failures = check_query_plans(engine)
+    for description, index_name, plan in failures:
+        log.error(f'❌ {description}: esperado {index_name}, plano obtido:\n{plan}')
+    if not failures:
+        log.info('✓ Todas as consultas quentes usam índice')
+    return not failures
+
 if __name__ == '__main__':
     if create_database():
-        print('\n✅ Banco de dados pronto para uso!')
+        log.info('✅ Banco de dados pronto para uso!')
+        if '--check-plans' in sys.argv and not check_indexes():
+            sys.exit(1)
     else:
-        print('\n❌ Falha na inicialização do banco de dados')
+        log.error('❌ Falha na inicialização do banco de dados')
@@ -0,0 +1,159 @@
+"""
+Teste de carga: vazão com 1, 2, 4... workers
+
+Para cada quantidade de workers, sobe o cluster (cluster.py), cria salas
+simuladas com clientes python-socketio e joga rodadas completas
+(start_round, submit_answers, stop_game, calculate_scores, next_round).
+Os clientes se conectam direto na porta do worker dono da sala, como o proxy faria.
+
+Uso:
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 python loadtest.py --workers 1 2 4
+"""
+import argparse
+import os
+import random
+import socket
+import threading
+import time
+from multiprocessing import Pool
+
+import socketio
+
+from cluster import start_workers, stop_workers, worker_port
+from sharding import worker_for_digit
+
+EVENT_TIMEOUT = 30
+
+
+class SimulatedPlayer:
+    def __init__(self, url, events=()):
+        self.client = socketio.Client(reconnection=False)
+        self.received = {}
+        self.events = {}
+        self.lock = threading.Lock()
+        for name in ('room_created', 'room_joined', 'round_starting', 'game_stopped',
+                     'scores_calculated', 'ready_for_next_round') + tuple(events):
+            self.client.on(name, self._handler(name))
+        self.client.connect(url, transports=['websocket'])
+
+    def _handler(self, name):
+        def handler(data):
+            with self.lock:
+                self.received[name] = data
+                self.events.setdefault(name, threading.Event()).set()
+        return handler
+
+    def wait(self, name):
+        with self.lock:
+            event = self.events.setdefault(name, threading.Event())
+        if not event.wait(EVENT_TIMEOUT):
+            raise TimeoutError(f'{name} não chegou em {EVENT_TIMEOUT}s')
+        with self.lock:
+            event.clear()
+            return self.received[name]
+
+
+def play_room(args):
+    """Cria uma sala no worker `worker`, joga as rodadas e retorna os eventos enviados"""
+    worker, workers, base_port, players, rounds = args
+    sent = 0
+
+    host = SimulatedPlayer(f'http://127.0.0.1:{worker_port(base_port, worker)}')
+    host.client.emit('create_room', {'player_name': 'Host'})
+    room_id = host.wait('room_created')['room_id']
+    sent += 1
+
+    owner_url = (f'http://127.0.0.1:{worker_port(base_port, worker_for_digit(room_id[0], workers))}'
+                 f'?room={room_id}')
+    guests = []
+    for i in range(players - 1):
+        guest = SimulatedPlayer(owner_url)
+        guest.client.emit('join_room', {'room_id': room_id, 'player_name': f'Jogador {i}'})
+        guest.wait('room_joined')
+        guests.append(guest)
+        sent += 1
+    everyone = [host] + guests
+
+    for _ in range(rounds):
+        host.client.emit('start_round', {'room_id': room_id})
+        categories = [p.wait('round_starting') for p in everyone][0]['categories']
+        sent += 1
+
+        for player in everyone:
+            answers = [random.choice('ABCDEFGHIJLMNOPQRSTUVZ') + 'teste' for _ in categories]
+            player.client.call('submit_answers', {'room_id': room_id, 'answers': answers},
+                               timeout=EVENT_TIMEOUT)
+            sent += 1
+
+        host.client.emit('stop_game', {'room_id': room_id})
+        for player in everyone:
+            player.wait('game_stopped')
+        host.client.emit('calculate_scores', {'room_id': room_id})
+        for player in everyone:
+            player.wait('scores_calculated')
+        host.client.emit('next_round', {'room_id': room_id})
+        for player in everyone:
+            player.wait('ready_for_next_round')
+        sent += 3
+
+    host.client.emit('close_room', {'room_id': room_id})
+    sent += 1
+    for player in everyone:
+        player.client.disconnect()
+    return sent
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f'Worker na porta {port} não subiu')
+
+
+def run(workers, rooms, players, rounds, base_port):
+    processes = start_workers(workers, base_port)
+    try:
+        for index in range(workers):
+            wait_for_port(worker_port(base_port, index))
+
+        jobs = [(i % workers, workers, base_port, players, rounds) for i in range(rooms)]
+        started = time.perf_counter()
+        with Pool(rooms) as pool:
+            sent = sum(pool.map(play_room, jobs))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop_workers(processes)
+
+    return {
+        'workers': workers,
+        'elapsed': elapsed,
+        'events': sent,
+        'events_per_sec': sent / elapsed,
+        'rounds_per_sec': rooms * rounds / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do Adedonha por quantidade de workers')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--rooms', type=int, default=16)
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--base-port', type=int, default=int(os.environ.get('BASE_PORT', '5101')))
+    args = parser.parse_args()
+
+    results = [run(w, args.rooms, args.players, args.rounds, args.base_port) for w in args.workers]
+
+    print()
+    print(f'{"workers":>8} {"tempo (s)":>10} {"eventos":>8} {"eventos/s":>10} {"rodadas/s":>10}')
+    for r in results:
+        print(f'{r["workers"]:>8} {r["elapsed"]:>10.2f} {r["events"]:>8} '
+              f'{r["events_per_sec"]:>10.1f} {r["rounds_per_sec"]:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
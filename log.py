@@ -0,0 +1,115 @@
+"""
+Logs estruturados do servidor
+
+`get_logger(nome)` devolve um logger com níveis (LOG_LEVEL) em que cada mensagem
+leva campos chave=valor:
+
+    log.info('✓ Sala criada', room_id=room_id, player=player_name)
+
+Mensagens frequentes (uma por tecla, por resposta...) podem ser amostradas com
+`sample=True`: só a fração LOG_SAMPLE_RATE delas é escrita. Os despejos de
+depuração de uma sala (todas as respostas, todos os jogadores) só são gerados
+para as salas em DEBUG_ROOMS ou ligadas em tempo de execução (enable_room_debug).
+"""
+import json
+import logging
+import os
+import random
+import sys
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# 'text' (chave=valor) ou 'json' (uma linha JSON por mensagem)
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+# Fração das mensagens amostradas (sample=True) que é escrita
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1.0'))
+
+# Salas com despejo de depuração ligado (DEBUG_ROOMS=ABCD1234,EFGH5678)
+_debug_rooms = {r.strip().upper() for r in os.environ.get('DEBUG_ROOMS', '').split(',') if r.strip()}
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record):
+        fields = getattr(record, 'fields', {})
+        if LOG_FORMAT == 'json':
+            entry = {
+                'time': self.formatTime(record),
+                'level': record.levelname,
+                'logger': record.name,
+                'message': record.getMessage(),
+            }
+            entry.update(fields)
+            if record.exc_info:
+                entry['exception'] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        line = f'{self.formatTime(record)} {record.levelname} [{record.name}] {record.getMessage()}'
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class StructuredLogger:
+    def __init__(self, logger):
+        self._logger = logger
+
+    def _log(self, level, message, sample=False, exc_info=False, **fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        if sample and LOG_SAMPLE_RATE < 1.0 and random.random() >= LOG_SAMPLE_RATE:
+            return
+        self._logger.log(level, message, exc_info=exc_info, extra={'fields': fields})
+
+    def is_enabled_for(self, level):
+        return self._logger.isEnabledFor(level)
+
+    def debug(self, message, **fields):
+        self._log(logging.DEBUG, message, **fields)
+
+    def info(self, message, **fields):
+        self._log(logging.INFO, message, **fields)
+
+    def warning(self, message, **fields):
+        self._log(logging.WARNING, message, **fields)
+
+    def error(self, message, **fields):
+        self._log(logging.ERROR, message, **fields)
+
+    def exception(self, message, **fields):
+        """Erro com o traceback da exceção em tratamento"""
+        self._log(logging.ERROR, message, exc_info=True, **fields)
+
+
+def _configure():
+    root = logging.getLogger('adedonha')
+    if root.handlers:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredFormatter())
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+
+
+def get_logger(name):
+    _configure()
+    return StructuredLogger(logging.getLogger(f'adedonha.{name}'))
+
+
+# ==================== DEPURAÇÃO POR SALA ====================
+
+def room_debug_enabled(room_id):
+    return bool(_debug_rooms) and room_id in _debug_rooms
+
+
+def enable_room_debug(room_id):
+    _debug_rooms.add(room_id.upper())
+
+
+def disable_room_debug(room_id):
+    _debug_rooms.discard(room_id.upper())
+
+
+def debug_rooms():
+    return sorted(_debug_rooms)
@@ -0,0 +1,191 @@
+"""
+Métricas do servidor no formato de texto do Prometheus (GET /metrics)
+
+Por evento do Socket.IO (registradas pelo on_event de game_events.py):
+quantidade, erros, histograma de latência, consultas ao banco e tempo gasto
+nelas, e tamanho dos payloads recebidos. Por mensagem enviada: tamanho do
+payload (transport.emit). Tarefas em segundo plano (gravação em lote, carga de
+sala, reaper) têm o próprio histograma de duração. Contadores de outros módulos
+(pool do banco, total de consultas do processo, reaper, broadcast) entram por
+register_collector.
+
+METRICS_ENABLED=false desliga a coleta (o /metrics continua respondendo, com
+os coletores registrados).
+
+Medir o tamanho de um payload é serializá-lo de novo em JSON, então os
+histogramas de tamanho são amostrados: só a fração METRICS_PAYLOAD_SAMPLE_RATE
+dos payloads é medida (1.0 mede todos, 0 desliga). Contagens e latências são
+sempre completas.
+"""
+import json
+import os
+import random
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+# Fração dos payloads (recebidos e enviados) com o tamanho medido
+METRICS_PAYLOAD_SAMPLE_RATE = float(os.environ.get('METRICS_PAYLOAD_SAMPLE_RATE', '0.01'))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # o último é o +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Family:
+    """Uma métrica com rótulos: {valores dos rótulos: contador ou Histogram}"""
+
+    def __init__(self, name, kind, help_text, labels, buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def histogram(self, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = Histogram(self.buckets)
+        return series
+
+    def inc(self, *label_values, amount=1):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} {self.kind}')
+        for label_values, series in sorted(self.series.items()):
+            labels = _labels(zip(self.labels, label_values))
+            if self.kind != 'histogram':
+                lines.append(f'{self.name}{{{labels}}} {_number(series)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series.counts):
+                cumulative += count
+                le = _labels([('le', bound if bound == '+Inf' else _number(bound))])
+                lines.append(f'{self.name}_bucket{{{labels},{le}}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {_number(series.sum)}')
+            lines.append(f'{self.name}_count{{{labels}}} {series.count}')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_lock = threading.Lock()
+
+events_total = Family('adedonha_events_total', 'counter', 'Eventos do Socket.IO tratados', ('event',))
+event_errors = Family('adedonha_event_errors_total', 'counter', 'Eventos que terminaram em exceção', ('event',))
+event_duration = Family('adedonha_event_duration_seconds', 'histogram', 'Duração do handler do evento',
+                        ('event',), LATENCY_BUCKETS)
+event_queries = Family('adedonha_event_db_queries_total', 'counter', 'Consultas ao banco feitas pelos handlers',
+                       ('event',))
+event_db_seconds = Family('adedonha_event_db_seconds_total', 'counter', 'Tempo das consultas ao banco dos handlers',
+                          ('event',))
+event_payload = Family('adedonha_event_payload_bytes', 'histogram',
+                       'Tamanho (JSON) dos payloads recebidos (amostra, METRICS_PAYLOAD_SAMPLE_RATE)',
+                       ('event',), SIZE_BUCKETS)
+emit_payload = Family('adedonha_emit_payload_bytes', 'histogram',
+                      'Tamanho (JSON) dos payloads enviados (amostra, METRICS_PAYLOAD_SAMPLE_RATE)',
+                      ('event',), SIZE_BUCKETS)
+task_duration = Family('adedonha_task_duration_seconds', 'histogram', 'Duração das tarefas em segundo plano',
+                       ('task',), LATENCY_BUCKETS)
+
+FAMILIES = [events_total, event_errors, event_duration, event_queries, event_db_seconds,
+            event_payload, emit_payload, task_duration]
+
+# [(prefixo, função que devolve {nome: número}, tipo)]
+_collectors = []
+
+
+def payload_size(data):
+    return len(json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8'))
+
+
+def sample_payload():
+    """Este payload entra na amostra de tamanhos?"""
+    return METRICS_PAYLOAD_SAMPLE_RATE >= 1.0 or random.random() < METRICS_PAYLOAD_SAMPLE_RATE
+
+
+def observe_event(event, seconds, queries, db_seconds, payload, failed):
+    size = payload_size(payload) if payload is not None and sample_payload() else None
+    with _lock:
+        events_total.inc(event)
+        if failed:
+            event_errors.inc(event)
+        event_duration.histogram(event).observe(seconds)
+        if queries:
+            event_queries.inc(event, amount=queries)
+            event_db_seconds.inc(event, amount=db_seconds)
+        if size is not None:
+            event_payload.histogram(event).observe(size)
+
+
+def observe_emit(event, data):
+    if not sample_payload():
+        return
+    size = payload_size(data)
+    with _lock:
+        emit_payload.histogram(event).observe(size)
+
+
+@contextmanager
+def timed_task(task):
+    """Mede a duração de uma tarefa em segundo plano"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            task_duration.histogram(task).observe(elapsed)
+
+
+def register_collector(prefix, collect, kind='gauge'):
+    """Inclui no /metrics os números de `collect()` como `<prefixo>_<chave>`
+    (com `_total` no fim quando kind='counter')"""
+    _collectors.append((prefix, collect, kind))
+
+
+def render():
+    lines = []
+    with _lock:
+        for family in FAMILIES:
+            if family.series:
+                family.render(lines)
+    for prefix, collect, kind in _collectors:
+        for key, value in collect().items():
+            if not isinstance(value, (int, float)):
+                continue
+            name = f'{prefix}_{key}' + ('_total' if kind == 'counter' else '')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {_number(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,253 @@
+"""
+Migrações versionadas do schema (PostgreSQL)
+
+Cada migração é uma lista de comandos SQL idempotentes. A versão aplicada fica
+na tabela `schema_version`; `upgrade` aplica, em ordem e cada uma em sua própria
+transação, apenas as migrações com versão maior que a atual.
+"""
+from sqlalchemy import text
+from log import get_logger
+
+log = get_logger('migrations')
+
+# Chave do advisory lock que impede dois processos de migrarem ao mesmo tempo
+MIGRATION_LOCK_KEY = 48151623
+
+MIGRATIONS = [
+    (1, 'tabelas iniciais', [
+        """
+        CREATE TABLE IF NOT EXISTS rooms (
+            room_id VARCHAR(8) PRIMARY KEY,
+            host_id VARCHAR(50) NOT NULL,
+            game_state VARCHAR(20),
+            current_round INTEGER,
+            current_letter VARCHAR(1),
+            categories TEXT NOT NULL,
+            used_letters TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS players (
+            player_id VARCHAR(50) PRIMARY KEY,
+            room_id VARCHAR(8) NOT NULL,
+            name VARCHAR(50) NOT NULL,
+            score FLOAT,
+            is_host BOOLEAN
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS answers (
+            id SERIAL PRIMARY KEY,
+            room_id VARCHAR(8) NOT NULL,
+            player_id VARCHAR(50) NOT NULL,
+            round INTEGER NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            answer VARCHAR(100),
+            points FLOAT,
+            invalidated BOOLEAN,
+            validation_state VARCHAR(10)
+        )
+        """,
+    ]),
+    (2, 'índices compostos e chaves estrangeiras com ON DELETE CASCADE', [
+        # Linhas órfãs (sala ou jogador já apagados) impediriam as chaves estrangeiras
+        "DELETE FROM players WHERE room_id NOT IN (SELECT room_id FROM rooms)",
+        "DELETE FROM answers WHERE room_id NOT IN (SELECT room_id FROM rooms)",
+        "DELETE FROM answers WHERE player_id NOT IN (SELECT player_id FROM players)",
+        "ALTER TABLE players DROP CONSTRAINT IF EXISTS players_room_id_fkey",
+        """
+        ALTER TABLE players ADD CONSTRAINT players_room_id_fkey
+            FOREIGN KEY (room_id) REFERENCES rooms (room_id) ON DELETE CASCADE
+        """,
+        "ALTER TABLE answers DROP CONSTRAINT IF EXISTS answers_room_id_fkey",
+        """
+        ALTER TABLE answers ADD CONSTRAINT answers_room_id_fkey
+            FOREIGN KEY (room_id) REFERENCES rooms (room_id) ON DELETE CASCADE
+        """,
+        "ALTER TABLE answers DROP CONSTRAINT IF EXISTS answers_player_id_fkey",
+        """
+        ALTER TABLE answers ADD CONSTRAINT answers_player_id_fkey
+            FOREIGN KEY (player_id) REFERENCES players (player_id)
+            ON DELETE CASCADE ON UPDATE CASCADE
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_players_room_id ON players (room_id)",
+        "CREATE INDEX IF NOT EXISTS ix_answers_room_round ON answers (room_id, round)",
+        """
+        CREATE INDEX IF NOT EXISTS ix_answers_room_player_round_category
+            ON answers (room_id, player_id, round, category)
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_answers_player_id ON answers (player_id)",
+    ]),
+    (3, 'chave única das respostas para o upsert do submit_answers', [
+        # Mantém apenas a resposta mais recente de cada (sala, jogador, rodada, categoria)
+        """
+        DELETE FROM answers a USING answers b
+        WHERE a.room_id = b.room_id AND a.player_id = b.player_id
+          AND a.round = b.round AND a.category = b.category AND a.id < b.id
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_answers_room_player_round_category
+            ON answers (room_id, player_id, round, category)
+        """,
+        "DROP INDEX IF EXISTS ix_answers_room_player_round_category",
+    ]),
+    (4, 'última atividade da sala (reaper de salas abandonadas)', [
+        "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS last_activity TIMESTAMPTZ NOT NULL DEFAULT now()",
+        "CREATE INDEX IF NOT EXISTS ix_rooms_last_activity ON rooms (last_activity)",
+    ]),
+    (5, 'histórico compacto das partidas encerradas', [
+        # Só recebe INSERTs (room_store.archive_matches); sem chave estrangeira: sobrevive à sala
+        """
+        CREATE TABLE IF NOT EXISTS match_history (
+            id BIGSERIAL PRIMARY KEY,
+            room_id VARCHAR(8) NOT NULL,
+            round INTEGER NOT NULL,
+            letter VARCHAR(1),
+            answers JSONB NOT NULL,
+            archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_match_history_room_id ON match_history (room_id)",
+        "CREATE INDEX IF NOT EXISTS ix_match_history_archived_at ON match_history (archived_at)",
+    ]),
+    (6, 'respostas particionadas por dia de criação da sala, sem id nem chaves estrangeiras', [
+        "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS created_on DATE NOT NULL DEFAULT current_date",
+        "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS current_match INTEGER NOT NULL DEFAULT 1",
+        # A tabela antiga sai do caminho (os nomes dos índices são globais no schema)
+        "ALTER TABLE answers RENAME TO answers_unpartitioned",
+        "ALTER TABLE answers_unpartitioned DROP CONSTRAINT IF EXISTS answers_pkey",
+        "DROP INDEX IF EXISTS ix_answers_room_round",
+        "DROP INDEX IF EXISTS uq_answers_room_player_round_category",
+        "DROP INDEX IF EXISTS ix_answers_player_id",
+        # Sem chaves estrangeiras: apagar sala ou jogador não apaga respostas em cascata.
+        # A chave primária atende também a leitura da rodada (room_id, match_number, round)
+        """
+        CREATE TABLE answers (
+            room_id VARCHAR(8) NOT NULL,
+            match_number INTEGER NOT NULL DEFAULT 1,
+            round INTEGER NOT NULL,
+            player_id VARCHAR(50) NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            created_on DATE NOT NULL DEFAULT current_date,
+            answer VARCHAR(100),
+            points FLOAT,
+            invalidated BOOLEAN,
+            validation_state VARCHAR(10),
+            CONSTRAINT answers_pkey PRIMARY KEY (room_id, match_number, round, player_id, category, created_on)
+        ) PARTITION BY RANGE (created_on)
+        """,
+        # Partição de hoje para as respostas existentes (as próximas vêm de manage_answer_partitions)
+        """
+        DO $$
+        BEGIN
+            EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF answers FOR VALUES FROM (%L) TO (%L)',
+                           'answers_' || to_char(current_date, 'YYYYMMDD'), current_date, current_date + 1);
+        END $$
+        """,
+        """
+        INSERT INTO answers (room_id, match_number, round, player_id, category, created_on,
+                             answer, points, invalidated, validation_state)
+        SELECT a.room_id, r.current_match, a.round, a.player_id, a.category, r.created_on,
+               a.answer, a.points, a.invalidated, a.validation_state
+        FROM answers_unpartitioned a JOIN rooms r ON r.room_id = a.room_id
+        """,
+        "DROP TABLE answers_unpartitioned",
+    ]),
+    (7, 'chave normalizada das respostas (sem acentos, casefold, espaços colapsados)', [
+        # TEXT: a decomposição NFKD pode ficar maior que a resposta. As linhas antigas
+        # ficam com NULL e a chave é recalculada quando a sala é carregada
+        "ALTER TABLE answers ADD COLUMN IF NOT EXISTS answer_key TEXT",
+    ]),
+]
+
+# Consultas quentes e o índice que cada uma deve usar (ver init_db.py --check-plans).
+# Em tabelas particionadas vale o índice correspondente de cada partição.
+HOT_QUERIES = [
+    ('jogadores da sala', 'ix_players_room_id',
+     "SELECT * FROM players WHERE room_id = 'QP000001'"),
+    ('respostas da rodada', 'answers_pkey',
+     "SELECT * FROM answers WHERE created_on = current_date AND room_id = 'QP000001' "
+     "AND match_number = 1 AND round = 3"),
+    ('resposta de um jogador', 'answers_pkey',
+     "SELECT * FROM answers WHERE created_on = current_date AND room_id = 'QP000001' "
+     "AND match_number = 1 AND round = 3 AND player_id = 'qp1-1' AND category = 'Animal'"),
+    ('salas abandonadas (reaper)', 'ix_rooms_last_activity',
+     "SELECT room_id FROM rooms WHERE last_activity < now() - interval '6 hours' AND room_id > 'QP000001' "
+     "ORDER BY room_id LIMIT 500 FOR UPDATE SKIP LOCKED"),
+]
+
+# Volume sintético para o planejador enxergar tabelas realistas (desfeito no rollback)
+PLAN_FIXTURE = [
+    """
+    INSERT INTO rooms (room_id, host_id, game_state, current_round, categories, used_letters)
+    SELECT 'QP' || lpad(r::text, 6, '0'), 'qp' || r || '-1', 'waiting', 10, 'Nome,Animal,Cidade', ''
+    FROM generate_series(1, 500) r
+    """,
+    """
+    INSERT INTO players (player_id, room_id, name, score, is_host)
+    SELECT 'qp' || r || '-' || p, 'QP' || lpad(r::text, 6, '0'), 'Jogador ' || p, 0, p = 1
+    FROM generate_series(1, 500) r, generate_series(1, 4) p
+    """,
+    """
+    INSERT INTO answers (room_id, player_id, round, category, answer, points, invalidated, validation_state)
+    SELECT 'QP' || lpad(r::text, 6, '0'), 'qp' || r || '-' || p, rnd, c, 'Resposta', 0, false, 'valid'
+    FROM generate_series(1, 500) r, generate_series(1, 4) p, generate_series(1, 10) rnd,
+         unnest(ARRAY['Nome', 'Animal', 'Cidade']) c
+    """,
+    'ANALYZE rooms',
+    'ANALYZE players',
+    'ANALYZE answers',
+]
+
+
+def current_version(conn):
+    conn.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+    version = conn.execute(text('SELECT MAX(version) FROM schema_version')).scalar()
+    return version or 0
+
+
+def upgrade(engine):
+    """Aplica as migrações pendentes e retorna a versão final do schema"""
+    version = 0
+    for number, description, statements in MIGRATIONS:
+        with engine.begin() as conn:
+            conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            version = current_version(conn)
+            if number <= version:
+                continue
+            for statement in statements:
+                conn.execute(text(statement))
+            conn.execute(text('INSERT INTO schema_version (version) VALUES (:v)'), {'v': number})
+            version = number
+            log.info('✓ Migração aplicada', version=number, description=description)
+    return version
+
+
+def index_family(conn, index_name):
+    """O índice e, se ele for de uma tabela particionada, os índices das partições"""
+    partitions = conn.execute(text(
+        'SELECT relid::regclass::text FROM pg_partition_tree(CAST(:name AS regclass))'
+    ), {'name': index_name}).scalars().all()
+    return [index_name] + partitions
+
+
+def check_query_plans(engine):
+    """Confere com EXPLAIN se cada consulta quente usa o índice esperado, com o
+    volume de PLAN_FIXTURE inserido numa transação desfeita no fim.
+    Retorna a lista de (descrição, índice esperado, plano) que falharam.
+
+    Rodar com `python init_db.py --check-plans` (termina com erro se alguma
+    falhar) depois de mudar uma migração, um índice ou uma consulta de HOT_QUERIES."""
+    failures = []
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            for statement in PLAN_FIXTURE:
+                conn.execute(text(statement))
+            for description, index_name, sql in HOT_QUERIES:
+                plan = '\n'.join(row[0] for row in conn.execute(text(f'EXPLAIN {sql}')))
+                if not any(name in plan for name in index_family(conn, index_name)):
+                    failures.append((description, index_name, plan))
+        finally:
+            trans.rollback()
+    return failures
@@ -0,0 +1,166 @@
+"""
+Payloads do fim da rodada (game_stopped e scores_calculated) e a codificação compacta
+
+São as maiores mensagens do jogo: na forma original (`json`) cada resposta é um
+dicionário com as chaves repetidas ('playerId', 'category', 'answer'...). Na
+forma colunar (`columnar`) as linhas são os jogadores, na ordem de
+`player_ids`, e as colunas são as categorias, na ordem de `categories`:
+
+    {'format': 'columnar', 'player_ids': [...], 'categories': [...],
+     'answers': [[texto por categoria] por jogador], ...}
+
+Cada cliente escolhe a codificação ao entrar na sala (`encoding` no
+join_socketio_room, create_room ou join_room) e entra na sala Socket.IO da
+codificação (encoding_room); o servidor só monta as codificações usadas pelos
+jogadores da sala. O room.html expande o formato colunar de volta para o
+original antes de tratar a mensagem.
+"""
+from room_state import RoomSnapshot
+
+ENCODINGS = ('json', 'columnar')
+DEFAULT_ENCODING = 'json'
+
+
+def parse_encoding(value):
+    """Codificação pedida pelo cliente (clientes antigos não mandam nada)"""
+    return value if value in ENCODINGS else DEFAULT_ENCODING
+
+
+def encoding_room(room_id, encoding):
+    """Sala Socket.IO dos clientes da sala que usam a codificação"""
+    return f'{room_id}/{encoding}'
+
+
+def room_encodings(room):
+    """Codificações usadas pelos jogadores da sala"""
+    return sorted({p.encoding for p in room.players.values()}) or [DEFAULT_ENCODING]
+
+
+def _rows(room):
+    """({player_id: linha}, {categoria: coluna}) da tabela colunar"""
+    return (
+        {pid: i for i, pid in enumerate(room.players)},
+        {category: i for i, category in enumerate(room.categories)},
+    )
+
+
+def _answer_table(room, rows, columns):
+    table = [[''] * len(columns) for _ in rows]
+    for (pid, category), ans in room.answers.items():
+        row, column = rows.get(pid), columns.get(category)
+        if row is not None and column is not None:
+            table[row][column] = ans.answer
+    return table
+
+
+# ==================== game_stopped ====================
+
+def game_stopped_json(room, stopped_by, player_id, auto_invalidated, auto_repeated, auto_verified, auto_similar,
+                      auto_suspect):
+    return {
+        'stopped_by': stopped_by,
+        'player_id': player_id,
+        'all_answers': room.answer_grid(),
+        'auto_invalidated': auto_invalidated,
+        'auto_repeated': auto_repeated,
+        'auto_verified': auto_verified,
+        'auto_similar': auto_similar,
+        'auto_suspect': auto_suspect
+    }
+
+
+def game_stopped_columnar(room, stopped_by, player_id, auto_invalidated, auto_repeated, auto_verified, auto_similar,
+                          auto_suspect):
+    """auto_invalidated: [[linha, coluna, motivo]]; auto_repeated e auto_similar:
+    [[linha, coluna, semelhança]] (o texto já está em answers); auto_verified: [[linha, coluna]];
+    auto_suspect: [[linha, coluna, veredito]]"""
+    rows, columns = _rows(room)
+    return {
+        'format': 'columnar',
+        'stopped_by': stopped_by,
+        'player_id': player_id,
+        'player_ids': list(rows),
+        'categories': list(room.categories),
+        'answers': _answer_table(room, rows, columns),
+        'auto_invalidated': [
+            [rows[item['player_id']], item['category_index'], item['reason']]
+            for item in auto_invalidated if item['player_id'] in rows
+        ],
+        'auto_repeated': [
+            [rows[item['player_id']], item['category_index'], item['similarity']]
+            for item in auto_repeated if item['player_id'] in rows
+        ],
+        'auto_verified': [
+            [rows[item['player_id']], item['category_index']]
+            for item in auto_verified if item['player_id'] in rows
+        ],
+        'auto_similar': [
+            [rows[item['player_id']], item['category_index'], item['similarity']]
+            for item in auto_similar if item['player_id'] in rows
+        ],
+        'auto_suspect': [
+            [rows[item['player_id']], item['category_index'], item['verdict']]
+            for item in auto_suspect if item['player_id'] in rows
+        ],
+    }
+
+
+# ==================== scores_calculated ====================
+
+def scores_calculated_json(room, scores, results):
+    return {
+        'scores': scores,
+        'detailed_results': [
+            {
+                'playerId': ans.player_id,
+                'category': ans.category,
+                'answer': ans.answer,
+                'points': points,
+                'reason': reason
+            }
+            for ans, points, reason in results
+        ],
+        'players': RoomSnapshot(room).players,
+        'all_answers': room.answer_grid()
+    }
+
+
+def scores_calculated_columnar(room, scores, results):
+    """points/reasons: [[valor por categoria] por jogador], null onde não há
+    resposta; os motivos são índices em `reason_names`"""
+    rows, columns = _rows(room)
+    points_table = [[None] * len(columns) for _ in rows]
+    reasons_table = [[None] * len(columns) for _ in rows]
+    reason_names = []
+    reason_codes = {}
+    for ans, points, reason in results:
+        row, column = rows.get(ans.player_id), columns.get(ans.category)
+        if row is None or column is None:
+            continue
+        code = reason_codes.get(reason)
+        if code is None:
+            code = reason_codes[reason] = len(reason_names)
+            reason_names.append(reason)
+        points_table[row][column] = points
+        reasons_table[row][column] = code
+
+    players = list(room.players.values())
+    return {
+        'format': 'columnar',
+        'player_ids': list(rows),
+        'categories': list(room.categories),
+        'names': [p.name for p in players],
+        'totals': [float(p.score) for p in players],
+        'hosts': [i for i, p in enumerate(players) if p.is_host],
+        'scores': [scores.get(pid) for pid in rows],
+        'answers': _answer_table(room, rows, columns),
+        'points': points_table,
+        'reasons': reasons_table,
+        'reason_names': reason_names,
+    }
+
+
+ENCODERS = {
+    'game_stopped': {'json': game_stopped_json, 'columnar': game_stopped_columnar},
+    'scores_calculated': {'json': scores_calculated_json, 'columnar': scores_calculated_columnar},
+}
@@ -0,0 +1,158 @@
+"""
+Reaper: limpeza periódica de jogadores e salas abandonados
+
+O disconnect não remove ninguém (o jogador pode estar só recarregando a página
+ou trocando de rede). A cada REAPER_INTERVAL segundos o servidor (app.py ou
+asgi_app.py) chama o reaper, que:
+
+1. Remove da memória os jogadores desconectados há mais de PLAYER_GRACE_PERIOD
+   segundos, como se tivessem saído (host transferido, sala vazia apagada).
+   Quem reconecta antes disso (mesmo token em join_socketio_room) volta à sala.
+2. Apaga do banco, em lotes de REAPER_BATCH_SIZE, as salas deste shard que não
+   estão na memória e não têm atividade há ROOM_IDLE_TIMEOUT segundos (abas
+   fechadas antes de um reinício, salas de workers que caíram...). As respostas
+   delas vão antes para o histórico (match_history).
+3. Mantém as partições da tabela answers: cria as dos próximos dias e descarta
+   as expiradas (ver database.manage_answer_partitions). As respostas nunca são
+   apagadas linha a linha.
+
+Quantos jogadores, salas e linhas foram recuperados fica em `reaper_stats`
+(ver /debug/reaper).
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, func
+
+from database import db_session, manage_answer_partitions, Room, Player
+from game_events import room_store, remove_player_from_room
+from room_state import archive_matches
+from transport import emit
+import sharding
+from log import get_logger
+
+log = get_logger('reaper')
+
+REAPER_INTERVAL = float(os.environ.get('REAPER_INTERVAL', '30'))
+# Tempo para o jogador reconectar antes de ser removido da sala (segundos)
+PLAYER_GRACE_PERIOD = float(os.environ.get('PLAYER_GRACE_PERIOD', '120'))
+# Salas só no banco sem atividade há mais que isso são apagadas (segundos)
+ROOM_IDLE_TIMEOUT = float(os.environ.get('ROOM_IDLE_TIMEOUT', '21600'))
+REAPER_BATCH_SIZE = int(os.environ.get('REAPER_BATCH_SIZE', '500'))
+
+# Totais desde o início do processo
+reaper_stats = {
+    'runs': 0,
+    'players_expired': 0,
+    'rooms_closed': 0,
+    'rooms_deleted': 0,
+    'players_deleted': 0,
+    'partitions_dropped': 0,
+}
+
+
+def reap_memory():
+    """Remove os jogadores que passaram da carência e as salas vazias da memória.
+    Precisa de um transporte ativo (avisa os outros jogadores da sala)."""
+    players_expired = 0
+    for player_id in room_store.expired_players(PLAYER_GRACE_PERIOD):
+        room = room_store.room_for_player(player_id)
+        if room and player_id in room.players:
+            log.info('⌛ Jogador expirado', room_id=room.room_id, player=room.players[player_id].name)
+            remove_player_from_room(room, player_id)
+            players_expired += 1
+
+    # Salas sem jogadores (ex.: carregadas do banco sem nenhum jogador)
+    empty_rooms = [room_id for room_id, room in list(room_store.rooms.items()) if not room.players]
+    for room_id in empty_rooms:
+        room_store.delete(room_id)
+
+    return {'players_expired': players_expired, 'rooms_closed': len(empty_rooms)}
+
+
+def idle_rooms_query(after=None):
+    """Lote de salas abandonadas deste shard, em ordem de código a partir de
+    `after`. Pode trazer salas que estão na memória: quem chama as descarta (um
+    NOT IN com todas as salas da memória seriam milhares de parâmetros por lote)."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ROOM_IDLE_TIMEOUT)
+    query = select(
+        Room.room_id, Room.used_letters, Room.current_round, Room.current_match, Room.created_on
+    ).where(Room.last_activity < cutoff)
+    if sharding.WORKER_COUNT > 1:
+        # As salas dos outros shards vivem na memória dos outros workers
+        owned = [digit for digit in sharding.HEX_DIGITS if sharding.owns(digit)]
+        query = query.where(func.left(Room.room_id, 1).in_(owned))
+    if after is not None:
+        query = query.where(Room.room_id > after)
+    return query.order_by(Room.room_id).limit(REAPER_BATCH_SIZE).with_for_update(skip_locked=True)
+
+
+def sweep_database(db):
+    """Apaga as salas abandonadas em lotes (um DELETE por tabela e por lote, cada
+    lote na sua transação) e descarta as partições expiradas das respostas.
+    Retorna as contagens e os códigos das salas apagadas."""
+    report = {'rooms_deleted': 0, 'players_deleted': 0, 'partitions_dropped': 0, 'room_ids': []}
+    after = None
+    while True:
+        batch = db.execute(idle_rooms_query(after)).all()
+        if not batch:
+            break
+        # O lote seguinte começa depois deste: salas da memória puladas aqui não
+        # voltam no próximo lote
+        after = batch[-1].room_id
+        rows = [row for row in batch if row.room_id not in room_store.rooms]
+        if rows:
+            room_ids = [row.room_id for row in rows]
+            # As partidas das salas abandonadas também vão para o histórico
+            archive_matches(db, [
+                (row.room_id, row.used_letters.split(',') if row.used_letters else [],
+                 row.current_round, row.current_match, row.created_on, None)
+                for row in rows
+            ])
+            # Jogadores antes das salas: o ON DELETE CASCADE não informa quantas linhas apagou.
+            # As respostas saem com a partição do dia.
+            report['players_deleted'] += db.execute(delete(Player).where(Player.room_id.in_(room_ids))).rowcount
+            report['rooms_deleted'] += db.execute(delete(Room).where(Room.room_id.in_(room_ids))).rowcount
+            report['room_ids'].extend(room_ids)
+        db.commit()
+
+        if len(batch) < REAPER_BATCH_SIZE:
+            break
+
+    _, dropped = manage_answer_partitions(db)
+    db.commit()
+    report['partitions_dropped'] = len(dropped)
+    for name in dropped:
+        log.info('🗑️ Partição de respostas descartada', partition=name)
+    return report
+
+
+def close_swept_rooms(room_ids):
+    """Salas apagadas que outro evento carregou para a memória durante a varredura
+    não existem mais no banco: fechá-las para não gravar jogadores sem sala"""
+    for room_id in room_ids:
+        if room_id in room_store.rooms:
+            emit('room_closed', {}, room=room_id)
+            room_store.forget(room_id)
+
+
+def record(report):
+    reaper_stats['runs'] += 1
+    for key, value in report.items():
+        reaper_stats[key] += value
+    if any(report.values()):
+        log.info('🧹 Reaper', **report)
+
+
+def reap():
+    """Uma passada completa do reaper (modo eventlet; o asgi_app.py faz as mesmas
+    etapas com await). Precisa de um transporte ativo."""
+    try:
+        report = reap_memory()
+        with db_session() as db:
+            swept = sweep_database(db)
+        close_swept_rooms(swept.pop('room_ids'))
+        report.update(swept)
+        record(report)
+    except Exception:
+        log.exception('Erro no reaper')
@@ -0,0 +1,740 @@
+"""
+Estado das salas em memória (fonte da verdade) com persistência write-behind
+
+Cada sala ativa, seus jogadores e as respostas da rodada atual ficam na memória
+do processo. Os handlers do Socket.IO leem e alteram apenas esse estado; as
+mudanças são registradas como escritas pendentes e gravadas no banco em lotes
+por um flusher em segundo plano (ver `RoomStore.flush`).
+
+O servidor roda sob eventlet (uma única thread do SO), então as alterações
+feitas pelos handlers não são interrompidas no meio - elas não fazem I/O.
+"""
+import hashlib
+import json
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy import insert, update, delete, values, column, text, bindparam, ARRAY, String, Text, Integer, Float, Boolean, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import OperationalError, InterfaceError
+from sqlalchemy.orm import joinedload
+from database import db_session, today_utc, Room, Player, Answer
+from validation import normalize_answer
+from round_timer import scheduler as round_scheduler
+import sharding
+import metrics
+from log import get_logger
+
+log = get_logger('room_state')
+
+# Totais desde o início do processo (ver /metrics)
+write_stats = {
+    'rooms_dropped': 0,  # salas cujas escritas pendentes não puderam ser gravadas
+}
+
+
+class PlayerState:
+    def __init__(self, player_id, name, score=0.0, is_host=False):
+        self.player_id = player_id
+        self.name = name
+        self.score = score
+        self.is_host = is_host
+        self.encoding = 'json'  # codificação dos payloads grandes no cliente (payloads.py), só na memória
+
+    def to_row(self, room_id):
+        return {
+            'player_id': self.player_id,
+            'room_id': room_id,
+            'name': self.name,
+            'score': float(self.score),
+            'is_host': bool(self.is_host)
+        }
+
+    def to_payload(self):
+        return {
+            'id': self.player_id,
+            'name': self.name,
+            'score': float(self.score),
+            'isHost': bool(self.is_host)
+        }
+
+
+class AnswerState:
+    def __init__(self, player_id, category, answer, points=0.0, invalidated=False, validation_state='valid',
+                 answer_key=None):
+        self.player_id = player_id
+        self.category = category
+        self.answer = answer
+        # Chave de comparação (validation.normalize_answer), calculada uma vez por envio
+        self.answer_key = answer_key if answer_key is not None else normalize_answer(answer or '')
+        self.points = points
+        self.invalidated = invalidated
+        self.validation_state = validation_state
+
+    def to_row(self, room):
+        """Linha da resposta na rodada atual da sala"""
+        return {
+            'room_id': room.room_id,
+            'match_number': room.current_match,
+            'created_on': room.created_on,
+            'player_id': self.player_id,
+            'round': room.current_round,
+            'category': self.category,
+            'answer': self.answer,
+            'answer_key': self.answer_key,
+            'points': float(self.points),
+            'invalidated': bool(self.invalidated),
+            'validation_state': self.validation_state
+        }
+
+
+class RoomState:
+    def __init__(self, room_id, host_id, game_state='waiting', current_round=0,
+                 current_letter='', categories=None, used_letters=None, created_on=None, current_match=1):
+        self.room_id = room_id
+        self.created_on = created_on or today_utc()  # partição das respostas da sala
+        self.current_match = current_match
+        self.host_id = host_id
+        self.game_state = game_state
+        self.current_round = current_round
+        self.current_letter = current_letter
+        self.categories = list(categories or [])
+        self.used_letters = list(used_letters or [])
+        self.players = {}  # {player_id: PlayerState} na ordem de entrada
+        # Quem saiu durante a partida atual, {player_id: nome}: a linha do jogador é
+        # apagada do banco, mas as respostas dele entram no histórico da partida
+        self.departed = {}
+        # Versão da lista de jogadores (deltas em roster_delta). Só na memória: começa
+        # no relógio em ms para continuar crescendo quando a sala é recarregada do banco
+        self.roster_version = int(time.time() * 1000)
+        self.reset_round_state()
+
+    def reset_round_state(self):
+        """Descarta o estado da rodada atual (nova rodada ou nova partida)"""
+        self.answers = {}  # {(player_id, categoria): AnswerState} da rodada atual
+        self.validation = None  # RoundValidation da rodada atual (montada no stop_game)
+        self.submission_digests = {}  # {player_id: hash do último submit_answers da rodada}
+        self.answer_seqs = {}  # {player_id: último seq de alteração aplicado}
+        self.reorder_buffers = {}  # {player_id: {seq: alterações que chegaram adiantadas}}
+
+    def player_answers(self, player_id):
+        return [a for (pid, _), a in self.answers.items() if pid == player_id]
+
+    def answer_grid(self):
+        """Respostas da rodada por jogador, na ordem das categorias (payload all_answers)"""
+        index = {category: i for i, category in enumerate(self.categories)}
+        grid = {pid: [''] * len(self.categories) for pid in self.players}
+        for (pid, category), ans in self.answers.items():
+            i = index.get(category)
+            if i is not None and pid in grid:
+                grid[pid][i] = ans.answer
+        return [{'playerId': pid, 'answers': answers} for pid, answers in grid.items()]
+
+    def to_row(self):
+        return {
+            'room_id': self.room_id,
+            'host_id': self.host_id,
+            'game_state': self.game_state,
+            'current_round': self.current_round,
+            'current_letter': self.current_letter,
+            'categories': ','.join(self.categories),
+            'used_letters': ','.join(self.used_letters),
+            'created_on': self.created_on,
+            'current_match': self.current_match,
+            # Usado pelo reaper para apagar salas abandonadas que só existem no banco
+            'last_activity': datetime.now(timezone.utc)
+        }
+
+
+class RoomSnapshot:
+    """Payloads de uma sala montados uma única vez por evento e reaproveitados
+    em todas as mensagens que o evento envia"""
+
+    def __init__(self, room):
+        self.players = [p.to_payload() for p in room.players.values()]
+        self._players_by_id = {p['id']: p for p in self.players}
+        self.room = {
+            'id': room.room_id,
+            'host': room.host_id,
+            'gameState': room.game_state,
+            'currentRound': int(room.current_round),
+            'currentLetter': room.current_letter,
+            'categories': list(room.categories),
+            'players': self.players,
+            'rosterVersion': room.roster_version
+        }
+
+    def player(self, player_id):
+        return self._players_by_id.get(player_id)
+
+
+class PendingWrites:
+    """Escritas pendentes de uma sala, capturadas no momento da alteração"""
+
+    def __init__(self):
+        self.deleted = False
+        self.finished_matches = []   # partidas a arquivar (ver archive_matches), na ordem em que terminaram
+        self.finished_answer_rows = {}  # {(partida, player_id, rodada, categoria): linha} ainda não gravadas
+        self.new_room = False        # sala ainda não existe no banco (INSERT)
+        self.room_row = None
+        self.removed_players = set()
+        self.new_players = set()     # jogadores ainda não inseridos no banco
+        self.player_rows = {}        # {player_id: linha}
+        self.answer_rows = {}        # {(player_id, rodada, categoria): linha} para o upsert
+        self.answer_deletes = set()  # {(player_id, rodada, categoria)} que deixaram de existir
+        self.answer_scope = None     # (created_on, partida) de answer_deletes
+
+
+class RoomStore:
+    def __init__(self):
+        self.rooms = {}           # {room_id: RoomState}
+        self._player_rooms = {}   # {player_id: room_id}
+        self._sessions = {}       # {sid do Socket.IO: player_id} (sessão atual de cada jogador)
+        self._player_sids = {}    # {player_id: sid}
+        self._pending = {}        # {room_id: PendingWrites}
+        self._retry = []          # lotes que falharam e serão regravados antes dos novos
+        self._disconnected = {}   # {player_id: instante (monotonic) em que o socket caiu}
+        self._lock = threading.RLock()
+        # Carregar do banco, dentro do get(), salas que não estão na memória. O modo
+        # assíncrono (asgi_app.py) desliga e carrega as salas antes de chamar o handler.
+        self.autoload = True
+
+    # ==================== LEITURA ====================
+
+    def get(self, room_id):
+        """Retorna a sala da memória, carregando do banco se necessário"""
+        room = self.rooms.get(room_id)
+        if room is None and self.autoload and sharding.owns(room_id):
+            # Salas de outro shard nunca são carregadas aqui: o estado delas
+            # vive na memória do worker dono
+            room = self._load(room_id)
+        return room
+
+    def room_for_player(self, player_id):
+        """Sala do jogador. Não consulta o banco: só as salas da memória têm
+        jogadores conectados."""
+        room_id = self._player_rooms.get(player_id)
+        return self.rooms.get(room_id) if room_id else None
+
+    def _load(self, room_id):
+        with metrics.timed_task('room_load'), db_session() as db:
+            room = self.read_room(db, room_id)
+        return self.install(room) if room else None
+
+    def read_room(self, db, room_id):
+        """Lê a sala, os jogadores e as respostas da rodada atual do banco.
+        Não registra a sala na memória (ver install)."""
+        # Sala e jogadores em uma única consulta (LEFT OUTER JOIN)
+        row = db.query(Room).options(joinedload(Room.players)).filter(
+            Room.room_id == room_id
+        ).first()
+        if not row:
+            return None
+
+        room = RoomState(
+            room_id=row.room_id,
+            host_id=row.host_id,
+            game_state=row.game_state,
+            current_round=row.current_round or 0,
+            current_letter=row.current_letter,
+            categories=row.categories.split(','),
+            used_letters=row.used_letters.split(',') if row.used_letters else [],
+            created_on=row.created_on,
+            current_match=row.current_match
+        )
+
+        for p in row.players:
+            room.players[p.player_id] = PlayerState(p.player_id, p.name, p.score or 0.0, bool(p.is_host))
+
+        # Só a partição da sala; respostas de jogadores que já saíram continuam na tabela
+        round_answers = db.query(Answer).filter(
+            Answer.created_on == room.created_on,
+            Answer.room_id == room_id,
+            Answer.match_number == room.current_match,
+            Answer.round == room.current_round
+        ).all()
+        for a in round_answers:
+            if a.player_id not in room.players:
+                continue
+            room.answers[(a.player_id, a.category)] = AnswerState(
+                a.player_id, a.category, a.answer, a.points or 0.0,
+                bool(a.invalidated), a.validation_state or 'valid',
+                a.answer_key  # NULL nas respostas gravadas antes da migração 7: recalculada
+            )
+        return room
+
+    def install(self, room):
+        """Registra na memória uma sala lida do banco"""
+        room_id = room.room_id
+        with self._lock:
+            # Outro greenlet pode ter carregado a mesma sala enquanto consultávamos o banco
+            existing = self.rooms.get(room_id)
+            if existing is not None:
+                return existing
+            self.rooms[room_id] = room
+            # Os sockets antigos dos jogadores não existem neste processo: contam
+            # como desconectados até reconectarem (ou expirarem no reaper)
+            now = time.monotonic()
+            for pid in room.players:
+                self._player_rooms[pid] = room_id
+                self._disconnected[pid] = now
+        # Rodada em andamento quando a sala saiu da memória: o prazo não foi
+        # gravado, então a rodada ganha o tempo inteiro de novo
+        if room.game_state == 'playing':
+            round_scheduler.schedule(room, countdown=0)
+        return room
+
+    # ==================== CONEXÕES ====================
+
+    def bind_session(self, player_id, sid):
+        """Liga o jogador ao socket atual (entrada na sala ou reconexão). Só mexe no
+        mapa de sessões: o player_id não muda, então nada é regravado no banco.
+        Retorna o sid anterior do jogador (ou None)."""
+        with self._lock:
+            old_sid = self._player_sids.get(player_id)
+            if old_sid is not None and old_sid != sid:
+                self._sessions.pop(old_sid, None)
+            previous = self._sessions.get(sid)
+            if previous is not None and previous != player_id:
+                self._player_sids.pop(previous, None)
+            self._sessions[sid] = player_id
+            self._player_sids[player_id] = sid
+            self._disconnected.pop(player_id, None)
+        return old_sid
+
+    def player_for_sid(self, sid):
+        return self._sessions.get(sid)
+
+    def sid_for_player(self, player_id):
+        return self._player_sids.get(player_id)
+
+    def _drop_session(self, player_id):
+        sid = self._player_sids.pop(player_id, None)
+        if sid is not None:
+            self._sessions.pop(sid, None)
+
+    def mark_disconnected(self, sid):
+        """Registra a queda do socket (o reaper remove o jogador depois da carência).
+        Ignora sockets antigos: o jogador pode já ter reconectado por outro."""
+        with self._lock:
+            player_id = self._sessions.pop(sid, None)
+            if player_id is None or self._player_sids.get(player_id) != sid:
+                return
+            del self._player_sids[player_id]
+            if player_id in self._player_rooms:
+                self._disconnected[player_id] = time.monotonic()
+
+    def expired_players(self, grace_period):
+        """player_ids desconectados há mais de `grace_period` segundos"""
+        cutoff = time.monotonic() - grace_period
+        with self._lock:
+            return [pid for pid, since in self._disconnected.items() if since <= cutoff]
+
+    # ==================== ALTERAÇÕES ====================
+
+    def _pending_for(self, room_id):
+        pending = self._pending.get(room_id)
+        if pending is None:
+            pending = self._pending[room_id] = PendingWrites()
+        return pending
+
+    def create(self, room):
+        with self._lock:
+            self.rooms[room.room_id] = room
+            for pid in room.players:
+                self._player_rooms[pid] = room.room_id
+            pending = self._pending_for(room.room_id)
+            pending.new_room = True
+            pending.new_players.update(room.players)
+        self.touch_room(room)
+        for pid in room.players:
+            self.touch_player(room, pid)
+
+    def delete(self, room_id):
+        with self._lock:
+            room = self.rooms.pop(room_id, None)
+            if room:
+                for pid in room.players:
+                    self._player_rooms.pop(pid, None)
+                    self._disconnected.pop(pid, None)
+                    self._drop_session(pid)
+            # As escritas pendentes ainda são gravadas: a partida vai inteira para o
+            # histórico antes do DELETE (ver _write_batch)
+            pending = self._pending_for(room_id)
+            pending.deleted = True
+            if room:
+                self._finish_match(pending, room)
+
+    def forget(self, room_id):
+        """Tira a sala da memória e descarta as escritas pendentes, sem gravar nada
+        (a sala já não existe no banco)"""
+        with self._lock:
+            room = self.rooms.pop(room_id, None)
+            if room:
+                for pid in room.players:
+                    self._player_rooms.pop(pid, None)
+                    self._disconnected.pop(pid, None)
+                    self._drop_session(pid)
+            self._pending.pop(room_id, None)
+
+    def add_player(self, room, player):
+        with self._lock:
+            room.players[player.player_id] = player
+            self._player_rooms[player.player_id] = room.room_id
+            self._pending_for(room.room_id).new_players.add(player.player_id)
+        self.touch_player(room, player.player_id)
+
+    def remove_player(self, room, player_id):
+        """Remove o jogador. As respostas dele ficam na partição do dia (sem DELETE):
+        a sala não as lê mais e elas saem com a partição."""
+        with self._lock:
+            player = room.players.pop(player_id, None)
+            if player:
+                room.departed[player_id] = player.name
+            self._player_rooms.pop(player_id, None)
+            self._disconnected.pop(player_id, None)
+            self._drop_session(player_id)
+            for key in [k for k in room.answers if k[0] == player_id]:
+                del room.answers[key]
+            pending = self._pending_for(room.room_id)
+            pending.player_rows.pop(player_id, None)
+            pending.new_players.discard(player_id)
+            pending.removed_players.add(player_id)
+            for key in [k for k in pending.answer_rows if k[0] == player_id]:
+                del pending.answer_rows[key]
+            pending.answer_deletes = {k for k in pending.answer_deletes if k[0] != player_id}
+
+    def touch_room(self, room):
+        with self._lock:
+            self._pending_for(room.room_id).room_row = room.to_row()
+
+    def touch_player(self, room, player_id):
+        player = room.players.get(player_id)
+        if player:
+            with self._lock:
+                self._pending_for(room.room_id).player_rows[player_id] = player.to_row(room.room_id)
+
+    def touch_answers(self, room, player_id, categories=None):
+        """Agenda a gravação das respostas do jogador na rodada atual (todas ou só
+        as `categories` informadas)"""
+        if categories is None:
+            answers = room.player_answers(player_id)
+        else:
+            answers = [room.answers[(player_id, c)] for c in categories if (player_id, c) in room.answers]
+        with self._lock:
+            pending = self._pending_for(room.room_id)
+            for a in answers:
+                key = (player_id, room.current_round, a.category)
+                pending.answer_rows[key] = a.to_row(room)
+                pending.answer_deletes.discard(key)
+
+    def drop_answers(self, room, player_id, categories):
+        """Remove respostas do jogador na rodada atual (categorias que não vieram mais)"""
+        with self._lock:
+            pending = self._pending_for(room.room_id)
+            pending.answer_scope = (room.created_on, room.current_match)
+            for category in categories:
+                room.answers.pop((player_id, category), None)
+                key = (player_id, room.current_round, category)
+                pending.answer_rows.pop(key, None)
+                pending.answer_deletes.add(key)
+
+    def finish_match(self, room):
+        """Encerra a partida (nova partida): as respostas de todas as rodadas vão
+        para o histórico. Chamar antes de zerar a rodada e as letras e de
+        incrementar current_match; as linhas antigas não são apagadas (a partida
+        seguinte usa outro match_number)."""
+        with self._lock:
+            pending = self._pending_for(room.room_id)
+            self._finish_match(pending, room)
+            room.reset_round_state()
+
+    def _finish_match(self, pending, room):
+        # Nomes da memória: quem já saiu não tem mais linha em players
+        names = dict(room.departed)
+        names.update((pid, p.name) for pid, p in room.players.items())
+        pending.finished_matches.append((room.room_id, list(room.used_letters), room.current_round,
+                                         room.current_match, room.created_on, names))
+        room.departed = {}
+        # Respostas da partida encerrada ainda não gravadas: entram no histórico
+        pending.finished_answer_rows.update(
+            ((room.current_match,) + key, row) for key, row in pending.answer_rows.items())
+        pending.answer_rows = {}
+        pending.answer_deletes = set()
+
+    # ==================== PERSISTÊNCIA ====================
+
+    def flush(self):
+        """Grava as escritas pendentes de todas as salas em uma única transação.
+        Retorna o número de salas gravadas."""
+        batches = self.take_batches()
+        if not batches:
+            return 0
+
+        with metrics.timed_task('flush'), db_session() as db:
+            return self.write_batches(db, batches)
+
+    def take_batches(self):
+        """Retira as escritas pendentes (lotes que falharam primeiro)"""
+        with self._lock:
+            batches = self._retry
+            if self._pending:
+                batches = batches + [self._pending]
+            self._pending = {}
+            self._retry = []
+        return batches
+
+    def write_batches(self, db, batches):
+        """Grava os lotes e faz o commit. Se a transação falhar, grava sala por sala
+        (write_rooms_separately) para que uma sala com dados inválidos não impeça a
+        gravação das outras."""
+        try:
+            for batch in batches:
+                self._write_batch(db, batch)
+            db.commit()
+            return sum(len(batch) for batch in batches)
+        except (OperationalError, InterfaceError):
+            # Banco fora do ar ou conexão perdida: tudo volta para a próxima gravação
+            db.rollback()
+            log.exception('Erro ao gravar estado das salas', batches=len(batches))
+            self._requeue(batches)
+            return 0
+        except Exception:
+            db.rollback()
+            log.exception('Erro ao gravar estado das salas, gravando sala por sala', batches=len(batches))
+        return self.write_rooms_separately(db, batches)
+
+    def write_rooms_separately(self, db, batches):
+        """Grava cada sala num savepoint próprio. A sala que falhar tem as escritas
+        pendentes descartadas (ficam no log); as outras são gravadas normalmente."""
+        written = 0
+        try:
+            for batch in batches:
+                for room_id, pending in batch.items():
+                    try:
+                        with db.begin_nested():
+                            self._write_batch(db, {room_id: pending})
+                        written += 1
+                    except (OperationalError, InterfaceError):
+                        raise
+                    except Exception:
+                        log.exception('❌ Escritas da sala descartadas', room_id=room_id)
+                        write_stats['rooms_dropped'] += 1
+            db.commit()
+            return written
+        except Exception:
+            db.rollback()
+            log.exception('Erro ao gravar estado das salas', batches=len(batches))
+            self._requeue(batches)
+            return 0
+
+    def _requeue(self, batches):
+        with self._lock:
+            self._retry = batches + self._retry
+
+    def _write_batch(self, db, batch):
+        # 1. Estrutura de cada sala (sala, entradas e saídas de jogadores)
+        for room_id, pending in batch.items():
+            self._write_structure(db, room_id, pending)
+
+        # 2. Pontuação/dados de jogadores já existentes: um único UPDATE para o lote
+        changed_players = [
+            row
+            for pending in batch.values()
+            for pid, row in pending.player_rows.items() if pid not in pending.new_players
+        ]
+        if changed_players:
+            update_players(db, changed_players)
+
+        # 3. Partidas encerradas (nova partida ou sala apagada): respostas para o
+        # histórico antes do DELETE da sala, na mesma transação
+        finished = [pending for pending in batch.values() if pending.finished_matches]
+        if finished:
+            pending_rows = [row for pending in finished for row in pending.finished_answer_rows.values()]
+            if pending_rows:
+                upsert_answers(db, pending_rows)
+            archive_matches(db, [match for pending in finished for match in pending.finished_matches])
+
+        # Salas apagadas: um único DELETE (os jogadores caem pelo ON DELETE CASCADE;
+        # as respostas ficam na partição do dia)
+        deleted = [room_id for room_id, pending in batch.items() if pending.deleted]
+        if deleted:
+            db.execute(delete(Room).where(Room.room_id.in_(deleted)))
+
+        # 4. Respostas da rodada atual (sala e jogadores já existem - chaves estrangeiras):
+        # as apagadas de todas as salas num único DELETE, depois as gravadas num único upsert
+        answer_deletes = [
+            (pending.answer_scope[0], room_id, pending.answer_scope[1]) + key
+            for room_id, pending in batch.items()
+            for key in pending.answer_deletes
+        ]
+        if answer_deletes:
+            delete_answers(db, answer_deletes)
+
+        answer_rows = [row for pending in batch.values() for row in pending.answer_rows.values()]
+        if answer_rows:
+            upsert_answers(db, answer_rows)
+
+    def _write_structure(self, db, room_id, pending):
+        if pending.removed_players:
+            db.query(Player).filter(
+                Player.player_id.in_(pending.removed_players)
+            ).delete(synchronize_session=False)
+
+        if pending.room_row:
+            if pending.new_room:
+                db.execute(insert(Room), [pending.room_row])
+            else:
+                db.execute(update(Room).where(Room.room_id == room_id).values(**pending.room_row))
+
+        new_rows = [row for pid, row in pending.player_rows.items() if pid in pending.new_players]
+        if new_rows:
+            db.execute(insert(Player), new_rows)
+
+
+def update_players(db, rows):
+    """Atualiza vários jogadores com um único UPDATE ... FROM (VALUES ...)"""
+    data = values(
+        column('player_id', String),
+        column('name', String),
+        column('score', Float),
+        column('is_host', Boolean),
+        name='v'
+    ).data([(r['player_id'], r['name'], r['score'], r['is_host']) for r in rows])
+
+    db.execute(
+        update(Player)
+        .where(Player.player_id == data.c.player_id)
+        .values(name=data.c.name, score=data.c.score, is_host=data.c.is_host)
+    )
+
+
+_answer_insert = pg_insert(Answer)
+# INSERT ... ON CONFLICT na chave primária (room_id, match_number, round, player_id,
+# category, created_on). Montado uma vez: executado com a lista de linhas, o
+# SQLAlchemy usa o cache da compilação e agrupa as linhas em VALUES de várias
+# linhas (insertmanyvalues), sem compilar uma instrução nova a cada gravação.
+ANSWER_UPSERT = _answer_insert.on_conflict_do_update(
+    index_elements=['room_id', 'match_number', 'round', 'player_id', 'category', 'created_on'],
+    set_={
+        'answer': _answer_insert.excluded.answer,
+        'answer_key': _answer_insert.excluded.answer_key,
+        'points': _answer_insert.excluded.points,
+        'invalidated': _answer_insert.excluded.invalidated,
+        'validation_state': _answer_insert.excluded.validation_state
+    }
+)
+
+
+def upsert_answers(db, rows):
+    """Grava várias respostas (ANSWER_UPSERT)"""
+    db.execute(ANSWER_UPSERT, rows)
+
+
+# DELETE das respostas apagadas pela chave primária, com as chaves em arrays
+# (unnest): o texto da instrução não muda com a quantidade de respostas, então é
+# compilado e preparado uma vez. O filtro por created_on limita as partições lidas.
+ANSWER_DELETE = text("""
+    DELETE FROM answers a
+    USING unnest(:days, :room_ids, :matches, :rounds, :player_ids, :categories)
+          AS d(created_on, room_id, match_number, round, player_id, category)
+    WHERE a.created_on = ANY(:days)
+      AND a.created_on = d.created_on AND a.room_id = d.room_id AND a.match_number = d.match_number
+      AND a.round = d.round AND a.player_id = d.player_id AND a.category = d.category
+""").bindparams(
+    bindparam('days', type_=ARRAY(Date)),
+    bindparam('room_ids', type_=ARRAY(String)),
+    bindparam('matches', type_=ARRAY(Integer)),
+    bindparam('rounds', type_=ARRAY(Integer)),
+    bindparam('player_ids', type_=ARRAY(String)),
+    bindparam('categories', type_=ARRAY(String)),
+)
+
+
+def delete_answers(db, keys):
+    """Apaga várias respostas (ANSWER_DELETE). `keys`: [(created_on, room_id,
+    partida, player_id, rodada, categoria)], na ordem de PendingWrites.answer_deletes."""
+    db.execute(ANSWER_DELETE, {
+        'days': [k[0] for k in keys],
+        'room_ids': [k[1] for k in keys],
+        'matches': [int(k[2]) for k in keys],
+        'player_ids': [k[3] for k in keys],
+        'rounds': [int(k[4]) for k in keys],
+        'categories': [k[5] for k in keys],
+    })
+
+
+# Uma linha por rodada: {player_id: {name, points, answers: {categoria: [resposta, pontos, estado, invalidada]}}}.
+# A letra da rodada r é used_letters[r - 1 - deslocamento]: as letras recomeçam quando acabam,
+# então used_letters guarda só as das últimas (current_round - deslocamento) rodadas.
+# O nome vem do mapa `names` da partida (memória, inclui quem já saiu) ou, sem ele, da tabela
+# players; respostas de jogadores sem nome em nenhum dos dois ficam só na partição.
+ARCHIVE_SQL = text("""
+    WITH m AS (
+        SELECT room_id, string_to_array(letters, ',') AS letters, current_round, match_number, created_on,
+               names::jsonb AS names
+        FROM unnest(:room_ids, :letters, :rounds, :matches, :days, :names)
+             AS f(room_id, letters, current_round, match_number, created_on, names)
+    )
+    INSERT INTO match_history (room_id, round, letter, answers)
+    SELECT per_player.room_id, per_player.round,
+           CASE WHEN per_player.round > m.current_round - cardinality(m.letters)
+                THEN m.letters[per_player.round - (m.current_round - cardinality(m.letters))] END,
+           jsonb_object_agg(per_player.player_id, jsonb_build_object(
+               'name', per_player.name, 'points', per_player.points, 'answers', per_player.answers))
+    FROM (
+        SELECT a.room_id, a.match_number, a.round, a.player_id,
+               COALESCE(MIN(m.names ->> a.player_id), MIN(p.name)) AS name,
+               SUM(COALESCE(a.points, 0)) AS points,
+               jsonb_object_agg(a.category, jsonb_build_array(
+                   a.answer, a.points, a.validation_state, a.invalidated)) AS answers
+        FROM answers a
+        JOIN m ON m.room_id = a.room_id AND m.match_number = a.match_number AND m.created_on = a.created_on
+        LEFT JOIN players p ON p.player_id = a.player_id AND p.room_id = a.room_id
+        WHERE a.created_on = ANY(:days) AND a.room_id = ANY(:room_ids)
+        GROUP BY a.room_id, a.match_number, a.round, a.player_id
+    ) per_player
+    JOIN m ON m.room_id = per_player.room_id AND m.match_number = per_player.match_number
+    WHERE per_player.name IS NOT NULL
+    GROUP BY per_player.room_id, per_player.match_number, per_player.round, m.letters, m.current_round
+""").bindparams(
+    bindparam('room_ids', type_=ARRAY(String)),
+    bindparam('letters', type_=ARRAY(String)),
+    bindparam('rounds', type_=ARRAY(Integer)),
+    bindparam('matches', type_=ARRAY(Integer)),
+    bindparam('days', type_=ARRAY(Date)),
+    bindparam('names', type_=ARRAY(Text)),
+)
+
+
+def archive_matches(db, finished):
+    """Copia as respostas das partidas encerradas para o histórico (match_history),
+    uma linha por rodada. `finished`: [(room_id, letras usadas, rodada atual,
+    partida, created_on, {player_id: nome} ou None)]."""
+    db.execute(ARCHIVE_SQL, {
+        'room_ids': [f[0] for f in finished],
+        'letters': [','.join(f[1]) for f in finished],
+        'rounds': [int(f[2] or 0) for f in finished],
+        'matches': [int(f[3]) for f in finished],
+        'days': [f[4] for f in finished],
+        'names': [json.dumps(f[5] or {}) for f in finished],
+    })
+
+
+def new_player_token():
+    """Token secreto do jogador, guardado pelo cliente e enviado ao reconectar"""
+    return secrets.token_urlsafe(18)
+
+
+def player_id_for_token(token):
+    """player_id público derivado do token: vai para os outros jogadores sem
+    expor o token, e o servidor reconhece o jogador mesmo depois de reiniciar
+    (a sala é lida do banco sem nenhuma sessão)"""
+    return hashlib.blake2b(token.encode('utf-8'), digest_size=10, person=b'adedonha-player').hexdigest()
+
+
+def submission_digest(categories, texts):
+    """Hash do conteúdo de um submit_answers, para ignorar reenvios idênticos"""
+    content = '\x1f'.join(categories) + '\x1e' + '\x1f'.join(texts)
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
@@ -0,0 +1,86 @@
+"""
+Tempo das rodadas controlado pelo servidor
+
+Cada start_round agenda o fim da rodada (ROUND_COUNTDOWN segundos de contagem
+no cliente + ROUND_DURATION segundos de jogo). Um único heap guarda os prazos
+de todas as salas e um único loop do servidor (app.py ou asgi_app.py) dorme até
+o próximo prazo e para as rodadas vencidas, como se alguém tivesse clicado em
+PARE (game_events.auto_stop_rounds). Agendar custa O(log n).
+
+Rodadas paradas antes do prazo não são tiradas do heap: cada entrada leva a
+partida e a rodada da sala, e quando o prazo chega a entrada é descartada se a
+sala já estiver em outra rodada ou fora do jogo.
+
+Salas carregadas do banco no meio de uma rodada (reinício do servidor) ganham
+um prazo novo, inteiro (ver RoomStore.install). ROUND_DURATION=0 desliga.
+"""
+import heapq
+import os
+import threading
+import time
+
+ROUND_DURATION = float(os.environ.get('ROUND_DURATION', '180'))
+# Contagem regressiva do cliente antes de liberar as respostas (round_starting)
+ROUND_COUNTDOWN = 3
+# Maior intervalo entre duas verificações do loop (segundos)
+MAX_SLEEP = 1.0
+
+# Totais desde o início do processo (ver /metrics)
+round_timer_stats = {
+    'scheduled': 0,      # prazos agendados
+    'auto_stopped': 0,   # rodadas paradas pelo tempo
+    'stale': 0,          # prazos descartados (rodada já parada ou sala fechada)
+}
+
+
+def round_key(room):
+    """Identifica a rodada da sala: uma entrada antiga não para a rodada seguinte"""
+    return (room.current_match, room.current_round)
+
+
+class RoundScheduler:
+    def __init__(self, duration):
+        self.duration = duration
+        self._heap = []  # [(prazo (monotonic), sala, (partida, rodada))]
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.duration > 0
+
+    def schedule(self, room, countdown=ROUND_COUNTDOWN):
+        """Agenda o fim da rodada atual da sala"""
+        if not self.enabled:
+            return
+        deadline = time.monotonic() + countdown + self.duration
+        with self._lock:
+            heapq.heappush(self._heap, (deadline, room.room_id, round_key(room)))
+        round_timer_stats['scheduled'] += 1
+
+    def due(self):
+        """Há algum prazo vencido?"""
+        with self._lock:
+            return bool(self._heap) and self._heap[0][0] <= time.monotonic()
+
+    def take_due(self):
+        """Retira os prazos vencidos: [(sala, (partida, rodada))]"""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, room_id, key = heapq.heappop(self._heap)
+                due.append((room_id, key))
+        return due
+
+    def seconds_until_next(self):
+        """Quanto o loop pode dormir até o próximo prazo (no máximo MAX_SLEEP)"""
+        with self._lock:
+            if not self._heap:
+                return MAX_SLEEP
+            return min(MAX_SLEEP, max(0.0, self._heap[0][0] - time.monotonic()))
+
+    def pending(self):
+        return len(self._heap)
+
+
+scheduler = RoundScheduler(ROUND_DURATION)
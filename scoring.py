@@ -0,0 +1,59 @@
+"""
+Motor de pontuação da rodada
+
+Não depende do Flask nem do banco: recebe as respostas da rodada (objetos com
+player_id, category, answer, answer_key, invalidated e validation_state) e
+devolve os pontos. Os grupos de respostas repetidas vêm da validação calculada
+no stop_game.
+"""
+from validation import RoundValidation
+
+UNIQUE_POINTS = 10    # Resposta única
+REPEATED_POINTS = 5   # Resposta repetida
+HALF_POINTS = 5       # Meio ponto dado pelo anfitrião
+
+
+def score_answer(ans, validation):
+    """Pontos e motivo de uma resposta"""
+    if not ans.answer:
+        return 0, 'blank'
+    if ans.validation_state == 'invalid' or ans.invalidated:
+        return 0, 'invalidated'
+    if ans.validation_state == 'half':
+        return HALF_POINTS, 'half_point'
+
+    key = validation.key_for(ans)
+    if not validation.starts_with_letter(key):
+        return 0, 'wrong_letter'
+    if validation.repeat_count(ans.category, key) == 1:
+        return UNIQUE_POINTS, 'unique'
+    return REPEATED_POINTS, 'repeated'
+
+
+def score_round(answers, categories, current_letter, player_ids=(), validation=None):
+    """Calcula os pontos da rodada.
+
+    `validation` é a RoundValidation da rodada (calculada no stop_game); sem ela
+    os grupos são montados aqui. Retorna (scores, results): `scores` é
+    {player_id: pontos da rodada}, com todos os `player_ids` começando em 0, e
+    `results` é uma lista de (resposta, pontos, motivo) na ordem das categorias.
+    """
+    answers = list(answers)
+    if validation is None:
+        validation = RoundValidation(answers, categories, current_letter)
+
+    by_category = {category: [] for category in categories}
+    for ans in answers:
+        bucket = by_category.get(ans.category)
+        if bucket is not None:
+            bucket.append(ans)
+
+    scores = dict.fromkeys(player_ids, 0)
+    results = []
+    for category_answers in by_category.values():
+        for ans in category_answers:
+            points, reason = score_answer(ans, validation)
+            scores[ans.player_id] = scores.get(ans.player_id, 0) + points
+            results.append((ans, points, reason))
+
+    return scores, results
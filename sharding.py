@@ -0,0 +1,42 @@
+"""
+Afinidade de salas por worker (modo com vários processos)
+
+Cada worker guarda na memória apenas as salas do seu shard. O shard de uma sala
+vem do primeiro caractere (hexadecimal) do código: `int(código[0], 16) % WORKER_COUNT`.
+O proxy na frente dos workers lê o parâmetro `room` da URL do Socket.IO e
+encaminha a conexão para o worker dono da sala (ver cluster.py --nginx).
+
+Com WORKER_COUNT=1 (padrão) todas as salas pertencem ao único processo.
+"""
+import os
+import uuid
+
+WORKER_INDEX = int(os.environ.get('WORKER_INDEX', '0'))
+WORKER_COUNT = int(os.environ.get('WORKER_COUNT', '1'))
+
+HEX_DIGITS = '0123456789ABCDEF'
+
+
+def shard_for(room_id):
+    """Índice do worker dono da sala"""
+    try:
+        return int(room_id[0], 16) % WORKER_COUNT
+    except (ValueError, IndexError):
+        return None
+
+
+def owns(room_id):
+    return shard_for(room_id) == WORKER_INDEX
+
+
+def new_room_id():
+    """Código de sala novo que pertence a este worker"""
+    while True:
+        room_id = str(uuid.uuid4())[:8].upper()
+        if owns(room_id):
+            return room_id
+
+
+def worker_for_digit(digit, worker_count):
+    """Worker que atende os códigos começando por `digit` (usado pelo cluster.py)"""
+    return int(digit, 16) % worker_count
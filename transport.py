@@ -0,0 +1,133 @@
+"""
+Transporte do Socket.IO usado pelos handlers do jogo (game_events.py)
+
+Os handlers chamam `emit`, `join_room`, `leave_room` e `request.sid` como no
+Flask-SocketIO, mas sem depender dele: o servidor que despacha o evento
+(app.py com eventlet ou asgi_app.py com asyncio) instala um transporte no
+contexto atual antes de chamar o handler.
+
+As mensagens para salas passam pelo agrupamento de broadcast.py.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from broadcast import coalescer, COALESCED_EVENTS
+import metrics
+
+_current = ContextVar('socket_transport', default=None)
+
+
+class FlaskTransport:
+    """Repassa tudo para o Flask-SocketIO (modo eventlet)"""
+
+    def __init__(self, sid):
+        self.sid = sid
+
+    def emit(self, event, data, room=None, include_self=True):
+        from flask_socketio import emit
+        emit(event, data, room=room, include_self=include_self)
+
+    def join_room(self, room):
+        from flask_socketio import join_room
+        join_room(room)
+
+    def leave_room(self, room):
+        from flask_socketio import leave_room
+        leave_room(room)
+
+
+class BackgroundTransport:
+    """Envia pelo Flask-SocketIO fora de um evento (tarefas em segundo plano do
+    app.py, ex.: reaper). Só transmite para salas: não há socket atual."""
+
+    sid = None
+
+    def __init__(self, socketio):
+        self.socketio = socketio
+
+    def emit(self, event, data, room=None, include_self=True):
+        self.socketio.emit(event, data, to=room)
+
+
+class OutboxTransport:
+    """Guarda as operações do handler para o servidor assíncrono executar
+    (com await) depois que o handler termina, na mesma ordem"""
+
+    def __init__(self, sid):
+        self.sid = sid
+        self.operations = []
+
+    def emit(self, event, data, room=None, include_self=True):
+        self.operations.append(('emit', event, data, room, include_self))
+
+    def join_room(self, room):
+        self.operations.append(('join', room))
+
+    def leave_room(self, room):
+        self.operations.append(('leave', room))
+
+    async def deliver(self, sio):
+        for operation in self.operations:
+            kind = operation[0]
+            if kind == 'emit':
+                _, event, data, room, include_self = operation
+                await sio.emit(event, data, to=room or self.sid,
+                               skip_sid=None if include_self or not room else self.sid)
+            elif kind == 'join':
+                await sio.enter_room(self.sid, operation[1])
+            else:
+                await sio.leave_room(self.sid, operation[1])
+        self.operations = []
+
+
+@contextmanager
+def use_transport(transport):
+    token = _current.set(transport)
+    try:
+        yield transport
+    finally:
+        _current.reset(token)
+
+
+def current():
+    transport = _current.get()
+    if transport is None:
+        raise RuntimeError('Nenhum transporte do Socket.IO ativo (handler chamado fora de um evento)')
+    return transport
+
+
+class _Request:
+    @property
+    def sid(self):
+        return current().sid
+
+
+request = _Request()
+
+
+def emit(event, data, room=None, include_self=True):
+    if metrics.METRICS_ENABLED:
+        metrics.observe_emit(event, data)
+    if room is not None and coalescer.enabled:
+        if event in COALESCED_EVENTS:
+            coalescer.add(room, event, data)
+            return
+        # O que espera na sala sai antes, para não inverter a ordem das mensagens
+        flush_broadcasts(room)
+    current().emit(event, data, room=room, include_self=include_self)
+
+
+def flush_broadcasts(room):
+    """Envia já as mensagens agrupadas que esperam na sala (antes de mensagens
+    enviadas para outra sala Socket.IO com os mesmos clientes)"""
+    frames = coalescer.take(room)
+    if frames:
+        coalescer.send(current(), room, frames)
+
+
+def join_room(room):
+    current().join_room(room)
+
+
+def leave_room(room):
+    current().leave_room(room)
@@ -0,0 +1,259 @@
+"""
+Validação da rodada, calculada uma única vez no stop_game
+
+Guarda a tabela de respostas normalizadas, os grupos de respostas repetidas e a
+contagem de respostas válidas por grupo. A chave normalizada de cada resposta
+(normalize_answer) é calculada uma vez, quando a resposta chega (AnswerState),
+e gravada com ela em answers.answer_key. O stop_game usa a tabela para as
+validações automáticas, o invalidate_answer apenas ajusta as contagens e o
+calculate_scores lê os grupos prontos em vez de refazer tudo.
+
+Só respostas iguais contam como repetidas. As quase iguais ("girafa" e
+"girrafa", ver fuzzy_groups: no máximo uma edição - troca, inserção, remoção ou
+inversão de dois caracteres vizinhos - em chaves com pelo menos
+FUZZY_MIN_LENGTH caracteres) são apenas sugeridas ao anfitrião, que decide se
+são a mesma resposta (toggle_similar): "daniel" e "daniela" também estão a uma
+edição de distância. FUZZY_REPEATS=false desliga as sugestões.
+"""
+import os
+import re
+import unicodedata
+
+from log import get_logger
+
+log = get_logger('validation')
+
+# Sequências de espaços (inclusive tabulação e espaço não separável) viram um só
+_WHITESPACE = re.compile(r'\s+')
+
+FUZZY_REPEATS = os.environ.get('FUZZY_REPEATS', 'true').lower() == 'true'
+# Chaves mais curtas só se agrupam se forem iguais ("bolas" e "bolos" são palavras diferentes)
+FUZZY_MIN_LENGTH = 6
+
+
+def normalize_answer(text):
+    """Chave de comparação de uma resposta: sem acentos (NFKD sem as marcas
+    combinantes), casefold e espaços colapsados. "São  Paulo", "sao paulo" e
+    "SAO PAULO" têm a mesma chave; "Água" começa com "a"."""
+    if text.isascii():
+        # Caso comum (o room.html já tira os acentos): NFKD não muda nada
+        return _WHITESPACE.sub(' ', text).strip().lower()
+    decomposed = unicodedata.normalize('NFKD', text)
+    folded = ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return _WHITESPACE.sub(' ', folded).strip()
+
+
+def _signatures(key):
+    """A chave e as variantes sem um dos caracteres: duas chaves a uma edição de
+    distância sempre têm uma variante em comum"""
+    return {key} | {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+def one_edit_apart(a, b):
+    """True se `b` sai de `a` com exatamente uma troca, inserção, remoção ou
+    inversão de dois caracteres vizinhos"""
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    shortest = min(len(a), len(b))
+    while i < shortest and a[i] == b[i]:
+        i += 1
+    if len(a) > len(b):
+        return a[i + 1:] == b[i:]
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    # Mesmo tamanho: troca do caractere i ou inversão de i com i + 1
+    if a[i + 1:] == b[i + 1:]:
+        return True
+    return i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+
+
+def fuzzy_groups(counts):
+    """Agrupa as chaves de uma categoria ({chave: quantidade de respostas}).
+    Retorna {chave: (chave do grupo, semelhança)}.
+
+    As chaves mais frequentes viram chaves de grupo primeiro; cada chave entra
+    no primeiro grupo criado entre as chaves de grupo a uma edição de distância,
+    o mesmo em qualquer processo (não há cadeias:
+    "abcde" ~ "abcdf" ~ "abcgf" não junta a primeira com a última). As candidatas
+    saem de um índice por (primeira letra, variante sem um caractere), então o
+    custo é linear no número de chaves em vez de comparar todos os pares."""
+    grouped = {}
+    index = {}  # {(primeira letra, variante): [chaves de grupo]}
+    order = {}  # {chave de grupo: ordem de criação}
+    for key in sorted(counts, key=lambda k: (-counts[k], k)):
+        signatures = _signatures(key) if FUZZY_REPEATS and len(key) >= FUZZY_MIN_LENGTH else ()
+        # As variantes são um set: a ordem de criação desempata, não a ordem do hash
+        match = min((
+            group for signature in signatures
+            for group in index.get((key[0], signature), ())
+            if one_edit_apart(key, group)
+        ), key=order.get, default=None)
+        if match:
+            grouped[key] = (match, round(1 - 1 / max(len(key), len(match)), 2))
+            continue
+        grouped[key] = (key, 1.0)
+        order[key] = len(order)
+        for signature in signatures:
+            index.setdefault((key[0], signature), []).append(key)
+    return grouped
+
+
+class RoundValidation:
+    def __init__(self, answers, categories, current_letter):
+        self.letter = normalize_answer(current_letter or '')
+        self.category_index = {category: i for i, category in enumerate(categories)}
+        self.answered = []      # respostas não vazias das categorias da sala
+        self.by_category = {}   # {categoria: [respostas]}
+        self.keys = {}          # {(player_id, categoria): chave normalizada da resposta}
+        self.suggestions = {}   # {(categoria, chave): (chave parecida, semelhança)} para o anfitrião
+        self.merged = set()     # {(categoria, chave)} de sugestões aceitas: contam como a chave parecida
+        self.valid_counts = {}  # {(categoria, chave do grupo): respostas não invalidadas}
+
+        counts = {}  # {categoria: {chave: respostas}}
+        for ans in answers:
+            if not ans.answer or ans.category not in self.category_index:
+                continue
+            by_key = counts.setdefault(ans.category, {})
+            by_key[ans.answer_key] = by_key.get(ans.answer_key, 0) + 1
+            self.keys[(ans.player_id, ans.category)] = ans.answer_key
+            self.answered.append(ans)
+            self.by_category.setdefault(ans.category, []).append(ans)
+
+        for category, by_key in counts.items():
+            for key, (group, similarity) in fuzzy_groups(by_key).items():
+                if group != key:
+                    self.suggestions[(category, key)] = (group, similarity)
+
+        self.count_valid(answers)
+
+    def key_for(self, ans):
+        """Chave do grupo da resposta: a própria chave ou, se o anfitrião aceitou a
+        sugestão, a chave parecida"""
+        key = self.keys.get((ans.player_id, ans.category))
+        if (ans.category, key) in self.merged:
+            return self.suggestions[(ans.category, key)][0]
+        return key
+
+    def toggle_similar(self, ans):
+        """Aceita ou desfaz a sugestão de juntar a resposta (e as iguais a ela) à
+        chave parecida. Retorna False se a resposta não tiver sugestão."""
+        suggestion = (ans.category, self.keys.get((ans.player_id, ans.category)))
+        if suggestion not in self.suggestions:
+            return False
+        self.merged ^= {suggestion}
+        self.count_valid(self.answered)
+        return True
+
+    def repeat_marks(self, category):
+        """(repetidas, parecidas) entre as respostas válidas da categoria:
+        [{player_id, category_index, answer, similarity}]. Repetidas contam na
+        pontuação (iguais ou sugestão aceita); parecidas são sugestões ainda não
+        aceitas."""
+        answers = [ans for ans in self.by_category.get(category, ()) if not ans.invalidated]
+        group_sizes = {}
+        for ans in answers:
+            key = self.key_for(ans)
+            group_sizes[key] = group_sizes.get(key, 0) + 1
+
+        repeated, similar = [], []
+        for ans in answers:
+            suggestion = self.suggestions.get((category, ans.answer_key))
+            item = {
+                'player_id': ans.player_id,
+                'category_index': self.category_index[category],
+                'answer': ans.answer,
+                # Semelhança com a chave parecida; 1 para as iguais
+                'similarity': suggestion[1] if (category, ans.answer_key) in self.merged else 1.0,
+            }
+            if group_sizes[self.key_for(ans)] > 1:
+                repeated.append(item)
+            elif suggestion:
+                similar.append(dict(item, similarity=suggestion[1]))
+        return repeated, similar
+
+    def starts_with_letter(self, key):
+        return key.startswith(self.letter)
+
+    def repeat_count(self, category, key):
+        """Quantas respostas válidas iguais a esta (ou juntadas pelo anfitrião) existem na categoria"""
+        return self.valid_counts.get((category, key), 0)
+
+    def count_valid(self, answers):
+        self.valid_counts = {}
+        for ans in answers:
+            key = self.key_for(ans)
+            if key is not None and not ans.invalidated:
+                group = (ans.category, key)
+                self.valid_counts[group] = self.valid_counts.get(group, 0) + 1
+
+    def toggle(self, ans, was_invalidated):
+        """Atualiza as contagens depois que o anfitrião mudou o estado de uma resposta"""
+        key = self.key_for(ans)
+        if key is None or was_invalidated == ans.invalidated:
+            return
+        group = (ans.category, key)
+        self.valid_counts[group] = self.valid_counts.get(group, 0) + (1 if was_invalidated else -1)
+
+    def auto_validate(self, answers, classify=None, dictionary_invalidates=False):
+        """Regras automáticas do stop: letra errada e resposta de uma letra são
+        invalidadas; repetidas e parecidas são apenas marcadas para exibição. Com
+        `classify` (dictionary.classify), as respostas que estão no dicionário da
+        categoria são marcadas como conferidas e as demais como suspeitas, com o
+        veredito ('unknown' ou 'invalid'), para o anfitrião decidir; com
+        `dictionary_invalidates`, as 'invalid' são invalidadas.
+        Retorna (auto_invalidated, auto_repeated, auto_verified, auto_similar, auto_suspect)."""
+        auto_invalidated = []
+        auto_verified = []
+        auto_suspect = []
+
+        for ans in answers:
+            key = self.key_for(ans)
+            if key is None:
+                continue
+            cat_index = self.category_index[ans.category]
+
+            # 1. Verificar se não começa com a letra correta
+            if not self.starts_with_letter(key):
+                reason = 'wrong_letter'
+                log.debug('❌ Letra errada', answer=ans.answer, letter=self.letter.upper())
+
+            # 2. Verificar se tem apenas uma letra
+            elif len(key) == 1:
+                reason = 'too_short'
+                log.debug('❌ Muito curta', answer=ans.answer)
+
+            else:
+                # 3. Consultar o dicionário da categoria (se houver)
+                verdict = classify(ans.category, ans.answer_key) if classify else None
+                reason = None
+                if verdict == 'valid':
+                    auto_verified.append({'player_id': ans.player_id, 'category_index': cat_index})
+                elif verdict == 'invalid' and dictionary_invalidates:
+                    reason = 'not_in_dictionary'
+                    log.debug('❌ Fora do dicionário', answer=ans.answer, category=ans.category)
+                elif verdict:
+                    auto_suspect.append({'player_id': ans.player_id, 'category_index': cat_index,
+                                         'verdict': verdict})
+
+            if reason:
+                ans.validation_state = 'invalid'
+                ans.invalidated = True
+                auto_invalidated.append({
+                    'player_id': ans.player_id,
+                    'category_index': cat_index,
+                    'reason': reason
+                })
+
+        # 4. Repetidas (não invalida, só marca para exibição) e parecidas (sugestões)
+        auto_repeated = []
+        auto_similar = []
+        for category in self.category_index:
+            repeated, similar = self.repeat_marks(category)
+            auto_repeated.extend(repeated)
+            auto_similar.extend(similar)
+        log.debug('🔁 Repetidas e parecidas', repeated=len(auto_repeated), similar=len(auto_similar))
+
+        # As invalidações automáticas mudam as contagens usadas na pontuação
+        self.count_valid(answers)
+        return auto_invalidated, auto_repeated, auto_verified, auto_similar, auto_suspect
@@ -0,0 +1,9 @@
+"""
+Ponto de entrada de produção (WSGI)
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+O Socket.IO roda dentro do app Flask, então o mesmo objeto atende as páginas
+e as conexões. As opções do servidor ficam em gunicorn.conf.py.
+"""
+from app import app